@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Measure AST size and build time on a large generated program:
+    python scripts/bench_ast.py [-n STATEMENTS] [-r REPEAT]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from compiler.ast_builder import ASTBuilder
+from compiler.parser import CompilerParser
+
+
+def generate_program(statements: int) -> bytes:
+    """A main block mixing assignments, array accesses, loops and I/O."""
+    body = [" READ n;", " x := n;", " y := n;"]
+    templates = [
+        " x := y + {i};",
+        " t[{j}] := x * n;",
+        " IF x > {i} THEN y := t[{j}] - 1; ELSE y := x; ENDIF",
+        " FOR k FROM 1 TO n DO WRITE k; ENDFOR",
+        " y := x % {i};",
+    ]
+    for i in range(statements - 4):
+        body.append(templates[i % len(templates)].format(i=i + 1, j=i % 10))
+    body.append(" WRITE y;")
+    return (
+        "PROGRAM IS\n n, x, y, t[0:9]\nBEGIN\n" + "\n".join(body) + "\nEND\n"
+    ).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AST memory and build-time benchmark")
+    parser.add_argument("-n", "--statements", type=int, default=100_000)
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    source = generate_program(args.statements)
+    tree, errors = CompilerParser().parse(source)
+    assert not errors, errors[0].message
+    builder = ASTBuilder()
+
+    times = []
+    for _ in range(args.repeat):
+        gc.collect()
+        start = time.perf_counter()
+        builder.build(tree.root_node, source)
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    ast = builder.build(tree.root_node, source)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"statements      {args.statements}")
+    print(f"build time      {min(times) * 1000:.1f} ms (best of {args.repeat})")
+    print(f"AST size        {retained / 2**20:.1f} MiB")
+    print(f"build peak      {peak / 2**20:.1f} MiB")
+    del ast
+
+
+if __name__ == "__main__":
+    main()
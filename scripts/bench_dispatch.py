@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Per-node cost of handler dispatch in the IR and VM code generators, for a
+TypeDispatch table against the isinstance chains it replaced:
+    python scripts/bench_dispatch.py [-n STATEMENTS] [-r REPEAT]
+"""
+import argparse
+import copy
+import time
+
+from bench_ast import generate_program
+from compiler.ast_nodes import *
+from compiler.dispatch import TypeDispatch
+from compiler.intermediate_rep.IR_generator import IRGenerator
+from compiler.intermediate_rep.IR_ops import *
+from compiler.pipeline import CompilerPipeline
+
+# Order of the former IRGenerator._generate_command / VMCodeGenerator.compile_ir
+COMMAND_CHAIN = [
+    Assignment, IfStatement, WhileLoop, RepeatLoop,
+    ForLoop, ProcedureCall, ReadCommand, WriteCommand,
+]
+INSTRUCTION_CHAIN = [
+    IRLabel, IRRead, IRWrite, IRAssign, IRCondJump, IRArrayRead,
+    IRArrayWrite, IRJump, IRHalf, IRBinaryOp, IRReturn, IRProcCall,
+]
+
+
+def handle(owner, node):
+    return node
+
+
+def chain_dispatch(types):
+    """An unrolled if/elif isinstance chain over types, like the original code."""
+    namespace = {"handle": handle}
+    lines = ["def dispatch(owner, node):"]
+    for i, node_type in enumerate(types):
+        namespace[f"T{i}"] = node_type
+        keyword = "if" if i == 0 else "elif"
+        lines.append(f"    {keyword} isinstance(node, T{i}):")
+        lines.append("        return handle(owner, node)")
+    exec("\n".join(lines), namespace)
+    return namespace["dispatch"]
+
+
+def table_dispatch(types):
+    """A TypeDispatch lookup, as done by the generators."""
+    table = TypeDispatch()
+    table.register(*types)(handle)
+
+    def dispatch(owner, node):
+        return table[type(node)](owner, node)
+    return dispatch
+
+
+def per_node(dispatch, nodes, repeat: int) -> float:
+    """Best time per node, in nanoseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for node in nodes:
+            dispatch(None, node)
+        best = min(best, time.perf_counter() - start)
+    return best / len(nodes) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Handler dispatch microbenchmark")
+    parser.add_argument("-n", "--statements", type=int, default=20_000)
+    parser.add_argument("-r", "--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    ast, symbol_table = CompilerPipeline().analyze(generate_program(args.statements))
+    commands = []
+    stack = list(ast.commands)
+    while stack:
+        command = stack.pop()
+        commands.append(command)
+        for block in ("then_block", "else_block", "body"):
+            stack.extend(getattr(command, block, None) or [])
+    ir, _, _ = IRGenerator(symbol_table).generate(copy.deepcopy(ast))
+
+    print(f"{'':<16}{'nodes':>10}{'isinstance ns':>16}{'table ns':>12}")
+    for name, nodes, types in (
+        ("AST commands", commands, COMMAND_CHAIN),
+        ("IR instructions", ir, INSTRUCTION_CHAIN),
+    ):
+        chain = per_node(chain_dispatch(types), nodes, args.repeat)
+        table = per_node(table_dispatch(types), nodes, args.repeat)
+        print(f"{name:<16}{len(nodes):>10}{chain:>16.1f}{table:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
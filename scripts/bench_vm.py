@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Reference Machine against the block-compiling FastMachine on one program,
+checking they agree on output, cost and steps:
+    python scripts/bench_vm.py [-r REPEAT] program.mr [INPUT ...]
+Without a program, a sieve of Eratosthenes up to 20000 is compiled and run.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from compiler.pipeline import CompilerPipeline
+from compiler.simulator.fast import run_fast
+from compiler.simulator.machine import load_program, run
+
+SIEVE = b"""
+PROCEDURE mark(T s, n, p) IS
+  j
+BEGIN
+  j := p * p;
+  WHILE j <= n DO
+    s[j] := 1;
+    j := j + p;
+  ENDWHILE
+END
+PROGRAM IS
+  n, s[0:20000], i, c
+BEGIN
+  READ n;
+  FOR i FROM 0 TO n DO
+    s[i] := 0;
+  ENDFOR
+  FOR i FROM 2 TO n DO
+    IF s[i] = 0 THEN
+      mark(s, n, i);
+    ENDIF
+  ENDFOR
+  c := 0;
+  FOR i FROM 2 TO n DO
+    IF s[i] = 0 THEN
+      c := c + 1;
+    ENDIF
+  ENDFOR
+  WRITE c;
+END
+"""
+
+
+def best_of(repeat, engine, program, inputs):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = engine(program, inputs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", nargs="?", help="Compiled VM code")
+    parser.add_argument("inputs", type=int, nargs="*", help="Values for GET")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.file:
+        program, inputs = load_program(args.file), args.inputs
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sieve.mr")
+            CompilerPipeline().compile_to(SIEVE, path)
+            program, inputs = load_program(path), [20000]
+
+    reference, reference_time = best_of(args.repeat, run, program, inputs)
+    fast, fast_time = best_of(args.repeat, run_fast, program, inputs)
+    same = (reference.output, reference.cost, reference.steps) == (
+        fast.output, fast.cost, fast.steps
+    )
+
+    print(f"{reference.steps} instructions, cost {reference.cost}")
+    for name, elapsed in (("reference", reference_time), ("fast", fast_time)):
+        rate = reference.steps / elapsed / 1e6
+        print(f"  {name:<9} {elapsed * 1000:9.0f} ms  {rate:6.2f} M instructions/s")
+    print(f"  speedup   {reference_time / fast_time:9.1f}x")
+    if not same:
+        raise SystemExit("engines disagree on output, cost or steps")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,53 @@
 #!/usr/bin/env python3
 import argparse
+import os
 import sys
 
-from compiler.ast_builder import ASTBuilder
-from compiler.intermediate_rep.IR_generator import IRGenerator
-from compiler.parser import CompilerParser
-from compiler.semantic_analyzer import SemanticAnalyzer
+from compiler.batch import run_batch
+from compiler.cache import CompileCache
+from compiler.pipeline import CompilationError, CompilerPipeline
+from compiler.profiling import CompileProfile
+from compiler.source import read_source
 from compiler.utils import *
-from compiler.pre_assembler.memory_map import MemoryMap
-from compiler.vm_compiler.vm_code_generator import VMCodeGenerator
 
 
-from compiler.pre_assembler.memory_map import *
+def batch_main(args):
+    """Compile many files: args.file is the input spec, args.output_file the output directory."""
+    try:
+        manifest = run_batch(
+            args.file,
+            args.output_file,
+            jobs=args.jobs,
+            manifest_path=args.manifest,
+            cache_dir=args.cache_dir,
+        )
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    for entry in manifest["files"]:
+        if entry["status"] != "ok":
+            print(f"{entry['input']}: {entry['status']}")
+            if args.verbose:
+                for message in entry["errors"]:
+                    print(f"    {message}")
+
+    print(
+        f"Compiled {manifest['succeeded']}/{manifest['total']} files "
+        f"in {manifest['wall_time']:.2f}s using {manifest['jobs']} worker(s)"
+    )
+    if args.cache_dir:
+        print(f"Cache hits: {manifest['cache_hits']}/{manifest['total']}")
+    sys.exit(1 if manifest["failed"] else 0)
 
-def format_error(message: str, line: int, column: int, source_lines: list[str]) -> str:
-    source_line = source_lines[line - 1] if line <= len(source_lines) else ""
-    pointer = " " * column + "^"
-    return f"""
-Error at line {line}, column {column}:
-{message}
-{source_line}
-{pointer}
-"""
+
+def report_profile(profile: CompileProfile, args):
+    report = profile.to_json() if args.profile_format == "json" else profile.format_table()
+    if args.profile_output:
+        with open(args.profile_output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report, file=sys.stderr)
 
 
 def main():
@@ -31,79 +57,97 @@ def main():
     parser.add_argument(
         "--semantic-only", action="store_true", help="Only perform semantic analysis"
     )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Batch mode: 'file' is a directory, glob or manifest of sources "
+        "and 'output_file' is the output directory",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="Worker processes in batch and --per-procedure mode"
+    )
+    parser.add_argument(
+        "--manifest", help="Batch result manifest (default: <output>/manifest.json)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("JFTT_CACHE_DIR"),
+        help="Reuse compiled code from this on-disk cache (default: $JFTT_CACHE_DIR)",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Report per-stage time, memory and sizes"
+    )
+    parser.add_argument(
+        "--profile-format", choices=["table", "json"], default="table"
+    )
+    parser.add_argument(
+        "--profile-output", help="Write the profile to this file instead of stderr"
+    )
+    parser.add_argument(
+        "--profile-no-memory",
+        action="store_true",
+        help="Don't trace memory with --profile; tracemalloc slows every stage down",
+    )
+    parser.add_argument(
+        "--per-procedure",
+        action="store_true",
+        help="Compile one procedure at a time, in memory bounded by the "
+        "program's symbols rather than its code",
+    )
+    parser.add_argument(
+        "--source-map",
+        action="store_true",
+        help="Also write a map from output lines to source lines and procedures",
+    )
+    parser.add_argument(
+        "--source-map-output", help="Path of the source map (default: <output_file>.map)"
+    )
     parser.add_argument("output_file", help="Output file")
     args = parser.parse_args()
-    
+    if args.source_map and args.per_procedure:
+        parser.error("--source-map can't be combined with --per-procedure")
+
+    if args.batch:
+        batch_main(args)
 
     # Initialize compiler components
-    compiler = CompilerParser()
-    ast_builder = ASTBuilder()
-    semantic_analyzer = SemanticAnalyzer()
-    # vm_compiler = VMCompiler()
+    cache = CompileCache(args.cache_dir) if args.cache_dir else None
+    pipeline = CompilerPipeline(cache=cache)
 
     try:
-        # Read source file
-        with open(args.file) as f:
-            source = f.read()
-            source_lines = source.splitlines()
+        # Map the source file; it is parsed straight from the mapping
+        source = read_source(args.file)
     except FileNotFoundError:
         print(f"Error: File {args.file} not found")
         sys.exit(1)
 
-    # Parse source code
-    tree, syntax_errors = compiler.parse(source)
-    # debug_parse_tree(tree.root_node)
-    if syntax_errors:
-        print("Compilation failed due to syntax errors!")
-        for error in syntax_errors:
-            print(compiler.format_error(error))
-        sys.exit(1)
-
-
-    # Build AST
+    profile = CompileProfile(trace_memory=not args.profile_no_memory) if args.profile else None
     try:
-        ast = ast_builder.build(tree.root_node)
-    except ValueError as e:
-        print(f"Error building AST: {e}")
-        sys.exit(1)
-
-
-    # Perform semantic analysis
-    success, semantic_errors, symbol_table = semantic_analyzer.analyze(ast)
-    if not success:
-        print("\nCompilation failed due to semantic errors!")
-        for message in semantic_errors:
-            print(format_error(message, message.line, message.column, source_lines))
+        if args.semantic_only:
+            pipeline.analyze(source)
+            print("Semantic analysis completed successfully!")
+            sys.exit(0)
+
+        source_map = None
+        if args.source_map:
+            source_map = args.source_map_output or args.output_file + ".map"
+        pipeline.compile_to(
+            source, args.output_file, profile=profile,
+            per_procedure=args.per_procedure, jobs=args.jobs,
+            source_map=source_map,
+        )
+    except CompilationError as e:
+        if e.header:
+            print(e.header)
+        for message in e.messages:
+            print(message)
         sys.exit(1)
+    finally:
+        if profile is not None and profile.stages:
+            report_profile(profile, args)
 
-    if args.semantic_only:
-        print("Semantic analysis completed successfully!")
-        sys.exit(0)
-
-    # print_ast(ast)
-
-    # At this point we have:
-    # - Valid AST in 'ast'
-    # - Symbol table in 'symbol_table'
-    # - No syntax or semantic errors
-
-    # print("Compilation successful!")
-    tac_gen = IRGenerator(symbol_table)
-    ir, vars, proc_info = tac_gen.generate(ast)
-
-            
-    mem_manager = MemoryMap(vars)
-    
-
-    
-    code_gen = VMCodeGenerator(mem_manager, vars, proc_info, costly_ops=symbol_table.costly_operations)
-    code = code_gen.generate(ir)
-        
-        
-    with open(args.output_file, 'w+') as f:
-        for item in code:
-            f.write(item)
-            f.write("\n")
+    if args.verbose and cache is not None:
+        print("Cache " + ("hit" if pipeline.from_cache else "miss"))
 
 if __name__ == "__main__":
     main()
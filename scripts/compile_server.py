@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import os
+import sys
+
+from compiler.server import DEFAULT_TIMEOUT, CompileServer
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Resident compile server (JSON lines over stdin or a Unix socket)"
+    )
+    parser.add_argument("--socket", help="Listen on this Unix socket instead of stdin")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes")
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        help="Requests in flight before input stops being read (default: 4 * jobs)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="Default per-request timeout in seconds",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("JFTT_CACHE_DIR"),
+        help="On-disk compile cache shared by the workers (default: $JFTT_CACHE_DIR)",
+    )
+    args = parser.parse_args()
+
+    server = CompileServer(
+        jobs=args.jobs,
+        max_pending=args.max_pending,
+        timeout=args.timeout,
+        cache_dir=args.cache_dir,
+    )
+
+    try:
+        if args.socket:
+            print(f"Listening on {args.socket}", file=sys.stderr)
+            asyncio.run(server.serve_unix(args.socket))
+        else:
+            asyncio.run(server.serve_stdio())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+
+from compiler.simulator.machine import VMError, load_program
+from compiler.simulator.profiler import profile_program
+from compiler.source_map import SourceMap
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run compiled VM code and report where its cycles go, by source line, "
+        "procedure and loop"
+    )
+    parser.add_argument("file", help="VM code produced by compile.py --source-map")
+    parser.add_argument("-i", "--input", type=int, nargs="*", default=[], help="Values for GET, in order")
+    parser.add_argument(
+        "--input-file", help="Read GET values from this file, whitespace separated"
+    )
+    parser.add_argument("--map", help="Source map of the code (default: <file>.map)")
+    parser.add_argument("--source", help="Source program, to show the text of hot lines")
+    parser.add_argument("--top", type=int, default=20, help="Rows per table")
+    parser.add_argument(
+        "--collapsed", help="Also write cycles per call stack to this file, for flamegraph tools"
+    )
+    parser.add_argument(
+        "--step-limit", type=int, default=None, help="Stop after about this many instructions"
+    )
+    args = parser.parse_args()
+
+    inputs = args.input
+    if args.input_file:
+        with open(args.input_file) as f:
+            inputs = [int(word) for word in f.read().split()]
+
+    try:
+        program = load_program(args.file)
+        source_map = SourceMap.load(args.map or args.file + ".map")
+        source = None
+        if args.source:
+            with open(args.source) as f:
+                source = f.read().splitlines()
+        profile = profile_program(program, source_map, inputs, args.step_limit)
+    except FileNotFoundError as e:
+        print(f"Error: File {e.filename} not found")
+        sys.exit(1)
+    except (VMError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    for value in profile.output:
+        print(f"> {value}")
+    print()
+    print(profile.format_table(args.top, source))
+
+    if args.collapsed:
+        with open(args.collapsed, "w") as f:
+            for line in profile.collapsed():
+                f.write(line + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+
+from compiler.simulator.fast import run_fast
+from compiler.simulator.machine import VMError, load_program, run
+
+
+def interactive_input() -> int:
+    """Read GET values from stdin, prompting when it's a terminal."""
+    while True:
+        if sys.stdin.isatty():
+            print("? ", end="", flush=True)
+        line = sys.stdin.readline()
+        if not line:
+            raise VMError("GET with no input left")
+        try:
+            return int(line)
+        except ValueError:
+            print(f"Not an integer: {line.strip()!r}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run compiled VM code and report its cost")
+    parser.add_argument("file", help="VM code produced by compile.py")
+    parser.add_argument(
+        "-i",
+        "--input",
+        type=int,
+        nargs="*",
+        help="Values for GET, in order (default: read from stdin)",
+    )
+    parser.add_argument(
+        "--input-file", help="Read GET values from this file, whitespace separated"
+    )
+    parser.add_argument(
+        "--step-limit", type=int, default=None, help="Stop after this many instructions"
+    )
+    parser.add_argument(
+        "--reference",
+        action="store_true",
+        help="Use the plain reference interpreter instead of the block-compiling one",
+    )
+    args = parser.parse_args()
+
+    inputs = interactive_input
+    if args.input is not None:
+        inputs = args.input
+    elif args.input_file:
+        with open(args.input_file) as f:
+            inputs = [int(word) for word in f.read().split()]
+
+    try:
+        engine = run if args.reference else run_fast
+        result = engine(load_program(args.file), inputs, args.step_limit)
+    except FileNotFoundError:
+        print(f"Error: File {args.file} not found")
+        sys.exit(1)
+    except VMError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    for value in result.output:
+        print(f"> {value}")
+    print(f"Cost: {result.cost} cycles, {result.steps} instructions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,29 @@ class ASTBuilder:
     Converts tree-sitter parse tree into our AST representation.
     """
 
-    def build(self, node: Any) -> Program:
+    def __init__(self):
+        self.source = None
+
+    def text(self, node: Any) -> str:
+        """Source text of a token, sliced by byte offsets from the parsed buffer."""
+        if self.source is None:
+            return node.text.decode("utf8")
+        return self.source[node.start_byte : node.end_byte].decode("utf8")
+
+    def without_comments(self, node: Any) -> List[Any]:
+        """
+        Children of node but comments. Comments are extras, which may sit
+        between any two tokens, so a rule read by position only has its
+        children at their places when it has exactly as many as the rule.
+        """
+        return [child for child in node.children if child.type != "comment"]
+
+    def build(self, node: Any, source=None) -> Program:
         """
         Build complete program according to grammar:
         program_all -> procedures main
                     | main
+        source is the buffer the tree was parsed from (bytes or mmap).
         """
         if node.type != "program_all":
             raise ValueError(f"Expected program_all node, got {node.type}")
@@ -22,12 +40,17 @@ class ASTBuilder:
         declarations = []
         commands = []
 
-        # First collect all procedures
-        for child in node.children:
-            if child.type == "procedures":
-                procedures = self.build_procedures(child)
-            elif child.type == "main":
-                declarations, commands = self.build_main(child)
+        self.source = source
+        try:
+            # First collect all procedures
+            for child in node.children:
+                if child.type == "procedures":
+                    procedures = self.build_procedures(child)
+                elif child.type == "main":
+                    declarations, commands = self.build_main(child)
+        finally:
+            # Don't keep the (possibly memory-mapped) source alive
+            self.source = None
 
         return Program(
             location=self.get_location(node),
@@ -36,25 +59,41 @@ class ASTBuilder:
             commands=commands,
         )
 
+    def flatten_list(self, node: Any) -> List[Any]:
+        """
+        Children of a left-recursive list rule, in source order, with the
+        nested list nodes spliced out:
+        list -> list item ... | item ...
+        Walks down the chain iteratively, so long lists cost neither stack
+        depth nor repeated copying.
+        """
+        list_type = node.type
+        segments = []
+
+        while node is not None:
+            inner = None
+            items = []
+            for child in node.children:
+                if child.type == list_type and inner is None:
+                    inner = child
+                else:
+                    items.append(child)
+            segments.append(items)
+            node = inner
+
+        return [child for items in reversed(segments) for child in items]
+
     def build_procedures(self, node: Any) -> List[Procedure]:
         """
         Build list of procedures.
         procedures -> procedures PROCEDURE proc_head IS declarations BEGIN commands END
                     | procedures PROCEDURE proc_head IS BEGIN commands END
         """
-        procedures = []
-
-        def collect_procedures(node):
-            procs = []
-            for child in node.children:
-                if child.type == "procedures":
-                    procs.extend(collect_procedures(child))
-                elif child.type == "procedure_def":
-                    procs.append(self.build_procedure_def(child))
-            return procs
-
-        procedures = collect_procedures(node)
-        return procedures
+        return [
+            self.build_procedure_def(child)
+            for child in self.flatten_list(node)
+            if child.type == "procedure_def"
+        ]
 
     def build_procedure_def(self, node: Any) -> Procedure:
         """Build a single procedure definition."""
@@ -91,7 +130,7 @@ class ASTBuilder:
 
         for child in node.children:
             if child.type == "pidentifier" and not name:
-                name = child.text.decode("utf8")
+                name = self.text(child)
             elif child.type == "args_decl":
                 parameters = self.build_args_decl(child)
 
@@ -111,24 +150,16 @@ class ASTBuilder:
                 | T pidentifier               # Array parameter
         """
         parameters = []
+        is_array = False
 
-        def collect_params(node):
-            params = []
-            is_array = False
+        for child in self.flatten_list(node):
+            if child.type == "T":
+                is_array = True
+            elif child.type == "pidentifier":
+                parameters.append((self.text(child), is_array))
+                is_array = False
 
-            for child in node.children:
-                # print(f"child: {child} child.type: {child.type} child.text: {child.text}")
-                if child.type == "args_decl":
-                    params.extend(collect_params(child))
-                elif child.text == b"T":
-                    is_array = True
-                elif child.type == "pidentifier":
-                    params.append((child.text.decode("utf8"), is_array))
-                    is_array = False
-
-            return params
-
-        return collect_params(node)
+        return parameters
 
     def build_main(self, node: Any) -> Tuple[List[Declaration], List[Command]]:
         """
@@ -156,45 +187,32 @@ class ASTBuilder:
                     | pidentifier [ num : num ]
         """
         declarations = []
+        current_decl = None
+        num_values = []
+
+        def finish_declaration():
+            if current_decl is None:
+                return
+            if len(num_values) >= 2:
+                current_decl["start"] = num_values[0]
+                current_decl["end"] = num_values[1]
+            declarations.append(self.create_declaration(current_decl))
+
+        for child in self.flatten_list(node):
+            if child.type == "pidentifier":
+                finish_declaration()
+                current_decl = {
+                    "name": self.text(child),
+                    "start": None,
+                    "end": None,
+                    "location": self.get_location(child),
+                }
+                num_values = []
+            elif child.type == "num":
+                # Array bounds of the identifier just seen
+                num_values.append(int(self.text(child)))
+        finish_declaration()
 
-        def collect_declarations(node):
-            decls = []
-            # Handle recursive declaration structure
-            if len(node.children) > 0:
-                for child in node.children:
-                    if child.type == "declarations":
-                        decls.extend(collect_declarations(child))
-                    elif child.type == "pidentifier":
-                        # Create declaration for this identifier
-                        # print(f"Declaration child: {child} child.text: {child.text}")
-                        current_decl = {
-                            "name": child.text.decode("utf8"),
-                            "start": None,
-                            "end": None,
-                            "location": self.get_location(child),
-                        }
-
-                        # Look ahead for array bounds
-                        idx = node.children.index(child)
-                        remaining_children = node.children[idx + 1 :]
-                        num_values = []
-                        for next_child in remaining_children:
-                            if next_child.type == "num":
-                                num_values.append(int(next_child.text.decode("utf8")))
-                                if len(num_values) == 2:
-                                    break
-
-                        if len(num_values) == 2:
-                            # print(f"NUM VALUES: {num_values}")
-                            current_decl["start"] = num_values[0]
-                            current_decl["end"] = num_values[1]
-                            # print(f"current_decl: {current_decl}")
-
-                        decls.append(self.create_declaration(current_decl))
-
-            return decls
-
-        declarations = collect_declarations(node)
         return declarations
 
     def create_declaration(self, decl: dict) -> Declaration:
@@ -213,64 +231,49 @@ class ASTBuilder:
         commands -> commands command
                 | command
         """
-        commands = []
-
         if node.type != "commands":
             # Single command case
-            commands.append(self.build_command(node))
-            return commands
-
-        # Visit command nodes in order of appearance
-        def collect_commands(node):
-            cmd_nodes = []
-            # Find the deepest commands node first
-            for child in reversed(node.children):
-                if child.type == "commands":
-                    cmd_nodes.extend(collect_commands(child))
-                elif child.type == "command":
-                    cmd_nodes.append(child)
-            return cmd_nodes
+            return [self.build_command(node)]
 
-        # Collect command nodes in correct order
-        command_nodes = collect_commands(node)
-
-        # Build commands in original source order
-        for cmd_node in reversed(command_nodes):
-            commands.append(self.build_command(cmd_node))
-
-        return commands
+        return [
+            self.build_command(child)
+            for child in self.flatten_list(node)
+            if child.type == "command"
+        ]
 
     def build_command(self, node: Any) -> Command:
         """Build individual command based on its type."""
-        first_child = next(child for child in node.children if child.type not in {";"})
+        # Keywords are anonymous nodes whose type is the keyword itself
+        first_child = node.child(0)
+        kind = first_child.type
 
-        if first_child.type == "identifier":
+        if kind == "identifier":
             return self.build_assignment(node)
-        elif first_child.text == b"IF":
+        elif kind == "IF":
             return self.build_if_statement(node)
-        elif first_child.text == b"WHILE":
+        elif kind == "WHILE":
             return self.build_while_loop(node)
-        elif first_child.text == b"REPEAT":
+        elif kind == "REPEAT":
             return self.build_repeat_loop(node)
-        elif first_child.text == b"FOR":
+        elif kind == "FOR":
             return self.build_for_loop(node)
-        elif first_child.type == "proc_call":
+        elif kind == "proc_call":
             return self.build_proc_call(first_child)
-        elif first_child.text == b"READ":
+        elif kind == "READ":
             return self.build_read(node)
-        elif first_child.text == b"WRITE":
+        elif kind == "WRITE":
             return self.build_write(node)
 
-        raise ValueError(f"Unknown command type: {first_child.type}")
+        raise ValueError(f"Unknown command type: {kind}")
 
     def build_assignment(self, node: Any) -> Assignment:
         """Build assignment command: identifier := expression ;"""
-        target = self.build_identifier(
-            next(child for child in node.children if child.type == "identifier")
-        )
-        value = self.build_expression(
-            next(child for child in node.children if child.type == "expression")
-        )
+        if node.child_count == 4:
+            target, expression = node.child(0), node.child(2)
+        else:
+            target, _, expression, _ = self.without_comments(node)
+        target = self.build_identifier(target)
+        value = self.build_expression(expression)
         return Assignment(location=self.get_location(node), target=target, value=value)
 
     def build_if_statement(self, node: Any) -> IfStatement:
@@ -336,13 +339,13 @@ class ASTBuilder:
 
         for child in node.children:
             if child.type == "pidentifier" and not iterator:
-                iterator = child.text.decode("utf8")
+                iterator = self.text(child)
             elif child.type == "value":
                 if not start:
                     start = self.build_value(child)
                 else:
                     end = self.build_value(child)
-            elif child.text == b"DOWNTO":
+            elif child.type == "DOWNTO":
                 downto = True
             elif child.type == "commands":
                 body = self.build_commands(child)
@@ -367,7 +370,7 @@ class ASTBuilder:
 
         for child in node.children:
             if child.type == "pidentifier" and name is None:
-                name = child.text.decode("utf8")
+                name = self.text(child)
             elif child.type == "args":
                 arguments = self.collect_args(child)
 
@@ -377,39 +380,29 @@ class ASTBuilder:
 
     def collect_args(self, node: Any) -> List[Identifier]:
         """
-        Recursively collect arguments from args node.
+        Collect arguments from args node.
         Handles nested structure: args -> args , pidentifier | pidentifier
         """
-        arguments = []
-
-        def _collect_args(node):
-            args = []
-            for child in node.children:
-                if child.type == "args":
-                    args.extend(_collect_args(child))
-                elif child.type == "pidentifier":
-                    args.append(
-                        Identifier(
-                            location=self.get_location(child),
-                            name=child.text.decode("utf8"),
-                        )
-                    )
-            return args
-
-        return _collect_args(node)
+        return [
+            Identifier(location=self.get_location(child), name=self.text(child))
+            for child in self.flatten_list(node)
+            if child.type == "pidentifier"
+        ]
 
     def build_read(self, node: Any) -> ReadCommand:
         """Build read command: READ identifier ;"""
-        target = self.build_identifier(
-            next(child for child in node.children if child.type == "identifier")
-        )
+        if node.child_count == 3:
+            target = self.build_identifier(node.child(1))
+        else:
+            target = self.build_identifier(self.without_comments(node)[1])
         return ReadCommand(location=self.get_location(node), target=target)
 
     def build_write(self, node: Any) -> WriteCommand:
         """Build write command: WRITE value ;"""
-        value = self.build_value(
-            next(child for child in node.children if child.type == "value")
-        )
+        if node.child_count == 3:
+            value = self.build_value(node.child(1))
+        else:
+            value = self.build_value(self.without_comments(node)[1])
         return WriteCommand(location=self.get_location(node), value=value)
 
     def build_expression(self, node: Any) -> Expression:
@@ -422,20 +415,21 @@ class ASTBuilder:
                    | value / value
                    | value % value
         """
-        if len(node.children) == 1:
-            return self.build_value(node.children[0])
+        count = node.child_count
+        if count == 1:
+            return self.build_value(node.child(0))
 
-        # Binary operation
-        left = self.build_value(node.children[0])
-        operator = next(
-            child.text.decode("utf8")
-            for child in node.children
-            if child.text in {b"+", b"-", b"*", b"/", b"%"}
-        )
-        right = self.build_value(node.children[-1])
+        # Binary operation; the operator token's type is the operator
+        if count == 3:
+            left, operator, right = node.child(0), node.child(1), node.child(2)
+        else:
+            left, operator, right = self.without_comments(node)
 
         return BinaryOp(
-            location=self.get_location(node), left=left, operator=operator, right=right
+            location=self.get_location(node),
+            left=self.build_value(left),
+            operator=operator.type,
+            right=self.build_value(right),
         )
 
     def build_condition(self, node: Any) -> Condition:
@@ -448,22 +442,16 @@ class ASTBuilder:
                   | value >= value
                   | value <= value
         """
-        expressions = [
-            self.build_expression(child)
-            for child in node.children
-            if child.type == "expression"
-        ]
-        operator = next(
-            child.text.decode("utf8")
-            for child in node.children
-            if child.text in {b"=", b"!=", b">", b"<", b">=", b"<="}
-        )
+        if node.child_count == 3:
+            left, operator, right = node.child(0), node.child(1), node.child(2)
+        else:
+            left, operator, right = self.without_comments(node)
 
         return Condition(
             location=self.get_location(node),
-            left=expressions[0],
-            right=expressions[1],
-            operator=operator,
+            left=self.build_expression(left),
+            right=self.build_expression(right),
+            operator=operator.type,
         )
 
     def build_value(self, node: Any) -> Value:
@@ -472,17 +460,19 @@ class ASTBuilder:
         value -> num
               | identifier
         """
-        if node.type == "value":
-            node = node.children[0]
+        kind = node.type
+        if kind == "value":
+            node = node.child(0)
+            kind = node.type
 
-        if node.type == "num":
+        if kind == "num":
             return Number(
-                location=self.get_location(node), value=int(node.text.decode("utf8"))
+                location=self.get_location(node), value=int(self.text(node))
             )
-        elif node.type == "identifier":
+        elif kind == "identifier":
             return self.build_identifier(node)
 
-        raise ValueError(f"Unknown value type: {node.type}")
+        raise ValueError(f"Unknown value type: {kind}")
 
     def build_identifier(self, node: Any) -> Identifier:
         """
@@ -491,26 +481,26 @@ class ASTBuilder:
                    | pidentifier [ pidentifier ]
                    | pidentifier [ num ]
         """
-        name = None
-        array_index = None
-
-        for child in node.children:
-            if child.type == "pidentifier" and not name:
-                name = child.text.decode("utf8")
-            elif child.type in ["pidentifier", "num"]:
-                if child.type == "num":
-                    array_index = Number(
-                        location=self.get_location(child),
-                        value=int(child.text.decode("utf8")),
-                    )
-                else:
-                    array_index = Identifier(
-                        location=self.get_location(child),
-                        name=child.text.decode("utf8"),
-                    )
+        count = node.child_count
+        if count == 1:
+            return Identifier(location=self.get_location(node), name=self.text(node.child(0)))
+
+        if count == 4:
+            name, index = node.child(0), node.child(2)
+        else:
+            name, _, index, _ = self.without_comments(node)
+
+        if index.type == "num":
+            array_index = Number(
+                location=self.get_location(index), value=int(self.text(index))
+            )
+        else:
+            array_index = Identifier(
+                location=self.get_location(index), name=self.text(index)
+            )
 
         return Identifier(
-            location=self.get_location(node), name=name, array_index=array_index
+            location=self.get_location(node), name=self.text(name), array_index=array_index
         )
 
     def build_args(self, node: Any) -> List[Expression]:
@@ -525,7 +515,7 @@ class ASTBuilder:
                 args.append(
                     Identifier(
                         location=self.get_location(child),
-                        name=child.text.decode("utf8"),
+                        name=self.text(child),
                     )
                 )
         return args
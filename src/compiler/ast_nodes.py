@@ -1,85 +1,94 @@
 # src/compiler/ast_nodes.py
 from dataclasses import dataclass
-from typing import List, Optional, Union
+from typing import List, NamedTuple, Optional, Union
 
+# Nodes are slotted and locations are plain tuples: a large program builds
+# hundreds of thousands of these, and per-instance __dict__s dominated the
+# AST's footprint. Field names are unchanged.
 
-@dataclass
-class Location:
+
+class Location(NamedTuple):
     line: int
     column: int
 
 
-@dataclass
+@dataclass(slots=True)
 class ASTNode:
     location: Location
 
+    def __reduce__(self):
+        # Procedures are pickled to --per-procedure -j workers; rebuilding a
+        # node from its constructor arguments is cheaper than the default
+        # per-slot state
+        return type(self), tuple([getattr(self, name) for name in self.__match_args__])
+
 
-@dataclass
+@dataclass(slots=True)
 class Value(ASTNode):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Number(Value):
     value: int
 
 
-@dataclass
+@dataclass(slots=True)
 class Identifier(Value):
     name: str
     array_index: Optional["Expression"] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Expression(ASTNode):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class BinaryOp(Expression):
     left: Value
     operator: str
     right: Value
 
 
-@dataclass
+@dataclass(slots=True)
 class Condition(ASTNode):
     left: Expression
     operator: str
     right: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class Command(ASTNode):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Assignment(Command):
     target: Identifier
     value: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class IfStatement(Command):
     condition: Condition
     then_block: List[Command]
     else_block: Optional[List[Command]]
 
 
-@dataclass
+@dataclass(slots=True)
 class WhileLoop(Command):
     condition: Condition
     body: List[Command]
 
 
-@dataclass
+@dataclass(slots=True)
 class RepeatLoop(Command):
     body: List[Command]
     condition: Condition
 
 
-@dataclass
+@dataclass(slots=True)
 class ForLoop(Command):
     iterator: str
     start: Value
@@ -88,35 +97,35 @@ class ForLoop(Command):
     downto: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class ProcedureCall(Command):
     name: str
     arguments: List[Expression]
 
 
-@dataclass
+@dataclass(slots=True)
 class ReadCommand(Command):
     target: Identifier
 
 
-@dataclass
+@dataclass(slots=True)
 class WriteCommand(Command):
     value: Value
 
 
-@dataclass
+@dataclass(slots=True)
 class Declaration(ASTNode):
     name: str
     array_bounds: Optional[tuple[int, int]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ProcHead(ASTNode):
     name: str
     parameters: List[tuple[str, bool]]  # (name, is_array)
 
 
-@dataclass
+@dataclass(slots=True)
 class Procedure(ASTNode):
     name: str
     parameters: List[tuple[str, bool]]
@@ -124,7 +133,7 @@ class Procedure(ASTNode):
     commands: List[Command]
 
 
-@dataclass
+@dataclass(slots=True)
 class Program(ASTNode):
     procedures: List[Procedure]
     declarations: List[Declaration]
@@ -0,0 +1,141 @@
+# src/compiler/batch.py
+import glob
+import json
+import os
+import time
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+from .pipeline import compile_source, worker_pipeline, write_code
+from .source import read_source
+
+SOURCE_SUFFIX = ".imp"
+OUTPUT_SUFFIX = ".mr"
+
+
+def collect_inputs(spec: str) -> Tuple[List[str], str]:
+    """
+    Expand a batch input specification into source files.
+    spec -> directory        (searched recursively for *.imp)
+          | glob pattern     (e.g. 'tests/**/*.imp')
+          | manifest file    (one path per line, relative to the manifest, '#' comments)
+          | single .imp file
+    Returns the files and the root directory outputs are laid out against.
+    """
+    if os.path.isdir(spec):
+        pattern = os.path.join(spec, "**", "*" + SOURCE_SUFFIX)
+        return sorted(glob.glob(pattern, recursive=True)), spec
+
+    if any(char in spec for char in "*?["):
+        paths = sorted(
+            path for path in glob.glob(spec, recursive=True) if os.path.isfile(path)
+        )
+    elif spec.endswith(SOURCE_SUFFIX):
+        paths = [spec]
+    elif os.path.isfile(spec):
+        base = os.path.dirname(spec)
+        paths = []
+        with open(spec) as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    paths.append(os.path.join(base, line))
+    else:
+        raise FileNotFoundError(f"No such file or directory: {spec}")
+
+    if not paths:
+        return [], "."
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    return paths, root
+
+
+def output_path_for(source_path: str, root: str, output_dir: str) -> str:
+    """Mirror the source layout under output_dir, swapping the suffix."""
+    relative = os.path.relpath(os.path.abspath(source_path), os.path.abspath(root))
+    stem, _ = os.path.splitext(relative)
+    return os.path.join(output_dir, stem + OUTPUT_SUFFIX)
+
+
+def _compile_one(job: Tuple[str, str]) -> Dict:
+    """Compile one file with the worker's pipeline and describe the outcome."""
+    source_path, output_path = job
+    entry = {
+        "input": source_path,
+        "output": None,
+        "status": "ok",
+        "errors": [],
+        "worker": os.getpid(),
+    }
+    start = time.perf_counter()
+    compile_time = 0.0
+
+    try:
+        source = read_source(source_path)
+
+        compile_start = time.perf_counter()
+        result = compile_source(source)
+        compile_time = time.perf_counter() - compile_start
+
+        entry["status"] = result["status"]
+        entry["errors"] = result["errors"]
+        entry["cached"] = result["cached"]
+        if result["status"] == "ok":
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            write_code(output_path, result["code"])
+            entry["output"] = output_path
+    except OSError as e:
+        entry["status"] = "io_error"
+        entry["errors"] = [str(e)]
+
+    entry["compile_time"] = compile_time
+    entry["total_time"] = time.perf_counter() - start
+    return entry
+
+
+def run_batch(
+    spec: str,
+    output_dir: str,
+    jobs: Optional[int] = None,
+    manifest_path: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+) -> Dict:
+    """
+    Compile every file matched by spec into output_dir using a pool of
+    worker processes, each holding one warm CompilerPipeline (sharing the
+    compile cache in cache_dir, if given). A JSON result manifest (per-file
+    status and timings) is written to manifest_path, by default
+    output_dir/manifest.json.
+    """
+    inputs, root = collect_inputs(spec)
+    jobs = jobs or os.cpu_count() or 1
+    work = [(path, output_path_for(path, root, output_dir)) for path in inputs]
+
+    start = time.perf_counter()
+    if jobs == 1 or len(work) <= 1:
+        worker_pipeline(cache_dir)
+        results = [_compile_one(job) for job in work]
+    else:
+        chunksize = max(1, len(work) // (jobs * 8))
+        with Pool(
+            processes=jobs, initializer=worker_pipeline, initargs=(cache_dir,)
+        ) as pool:
+            results = list(pool.imap(_compile_one, work, chunksize=chunksize))
+    wall_time = time.perf_counter() - start
+
+    succeeded = sum(1 for entry in results if entry["status"] == "ok")
+    manifest = {
+        "jobs": jobs,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "cache_hits": sum(1 for entry in results if entry.get("cached")),
+        "wall_time": wall_time,
+        "files": results,
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = manifest_path or os.path.join(output_dir, "manifest.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
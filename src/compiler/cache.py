@@ -0,0 +1,231 @@
+# src/compiler/cache.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import asdict, dataclass
+from importlib import metadata
+from typing import Dict, List, Optional
+
+from .source import Source, source_bytes
+
+DEFAULT_MAX_BYTES = 256 * 2**20
+ENTRY_SUFFIX = ".mr"
+COPY_CHUNK = 2**20
+# Eviction frees space down to this fraction of max_bytes, so a full cache
+# is rescanned once per few stores rather than on every one
+EVICT_TARGET = 0.9
+
+_compiler_version: Optional[str] = None
+
+
+def _package_version(name: str) -> str:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def compiler_version() -> str:
+    """
+    Identify the compiler build: package versions plus a digest of the
+    compiler's own sources, so editing the code (without bumping the
+    version) still invalidates cached output.
+    """
+    global _compiler_version
+    if _compiler_version is None:
+        digest = hashlib.sha256()
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        for root, dirs, files in os.walk(package_dir):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    path = os.path.join(root, name)
+                    digest.update(os.path.relpath(path, package_dir).encode())
+                    with open(path, "rb") as f:
+                        digest.update(f.read())
+        _compiler_version = "{}+{}/{}".format(
+            _package_version("compiler"),
+            digest.hexdigest()[:16],
+            _package_version("tree-sitter-jftt"),
+        )
+    return _compiler_version
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CompileCache:
+    """
+    Content-addressed store of compiled VM code on disk.
+    An entry is keyed by the SHA-256 of the source bytes, the compiler
+    version and the compilation options, and lives at
+        <directory>/<key[:2]>/<key>.mr
+    in the same format as compiler output. Entries are written to a
+    temporary file and renamed into place, so concurrent writers (batch
+    workers, parallel CI jobs) never expose a partial entry. Reads bump the
+    entry's mtime; once the store grows past max_bytes the least recently
+    used entries are evicted, down to EVICT_TARGET of the budget.
+    The size of the store is scanned once and then kept as a running total,
+    updated on every store and eviction; the directory is only listed again
+    when that total exceeds the budget, which also picks up entries written
+    or evicted by other processes meanwhile.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._total: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source: Source, options: Optional[Dict] = None) -> str:
+        digest = hashlib.sha256()
+        digest.update(compiler_version().encode())
+        digest.update(b"\0")
+        digest.update(json.dumps(options or {}, sort_keys=True).encode())
+        digest.update(b"\0")
+        digest.update(source_bytes(source))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Cached code for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                code = f.read().splitlines()
+            os.utime(path)
+        except OSError:
+            # Missing, or evicted by another process between open and utime
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return code
+
+    def get_file(self, key: str, path: str) -> Optional[int]:
+        """
+        Copy the cached code for key to the file at path, in chunks, and
+        return its instruction count; None on a miss.
+        """
+        entry = self._path(key)
+        try:
+            source = open(entry, "rb")
+        except OSError:
+            self.stats.misses += 1
+            return None
+        lines = 0
+        with source, open(path, "wb") as f:
+            for chunk in iter(lambda: source.read(COPY_CHUNK), b""):
+                lines += chunk.count(b"\n")
+                f.write(chunk)
+        try:
+            os.utime(entry)
+        except OSError:
+            pass  # evicted meanwhile; the copy is complete anyway
+        self.stats.hits += 1
+        return lines
+
+    def put(self, key: str, code: List[str]) -> None:
+        def write(f):
+            for item in code:
+                f.write(item.encode())
+                f.write(b"\n")
+
+        self._store(key, write)
+
+    def put_file(self, key: str, source_path: str) -> None:
+        """Store an already written output file, copying it in chunks."""
+        def write(f):
+            with open(source_path, "rb") as source:
+                shutil.copyfileobj(source, f)
+
+        self._store(key, write)
+
+    def _store(self, key: str, write) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                size = f.tell()
+            try:
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.stats.stores += 1
+        if self._total is None:
+            self._total = self.size()
+        else:
+            self._total += size - replaced
+        if self._total > self.max_bytes:
+            self._evict()
+
+    def _entries(self):
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(ENTRY_SUFFIX):
+                    try:
+                        info = entry.stat()
+                    except OSError:
+                        continue
+                    yield info.st_mtime, info.st_size, entry.path
+
+    def size(self) -> int:
+        """Total bytes currently held by cache entries."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        entries = list(self._entries())
+        total = sum(size for _, size, _ in entries)
+        self._total = total
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * EVICT_TARGET)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                # Already evicted by another writer
+                pass
+            else:
+                self.stats.evictions += 1
+            total -= size
+        self._total = total
+
+    def clear(self) -> None:
+        for _, _, path in list(self._entries()):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        self._total = 0
+
+    def stats_dict(self) -> Dict:
+        stats = asdict(self.stats)
+        stats["hit_rate"] = self.stats.hit_rate
+        return stats
@@ -0,0 +1,56 @@
+# src/compiler/dispatch.py
+from typing import Callable, Optional
+
+
+class TypeDispatch(dict):
+    """
+    Handler table keyed on the exact type of a node, for passes that walk
+    the AST or the IR. Handlers are plain methods registered in the class
+    body and looked up with the node's type:
+
+        class Pass:
+            handlers = TypeDispatch()
+
+            @handlers.register(Assignment)
+            def visit_assignment(self, node): ...
+
+            def visit(self, node):
+                return self.handlers[type(node)](self, node)
+
+    A type without a handler of its own is resolved through its MRO on
+    first sight and cached, so every lookup after that is a plain dict
+    access. A pass deriving from another one should extend a copy() of its
+    table rather than the table itself.
+    """
+
+    def __init__(self, default: Optional[Callable] = None):
+        super().__init__()
+        self.default = default
+
+    def register(self, *types: type) -> Callable:
+        def decorator(handler: Callable) -> Callable:
+            for node_type in types:
+                self[node_type] = handler
+            return handler
+
+        return decorator
+
+    def __missing__(self, node_type: type) -> Callable:
+        for base in node_type.__mro__[1:]:
+            if base in self:
+                handler = self[base]
+                break
+        else:
+            if self.default is None:
+                raise TypeError(f"No handler for {node_type.__name__}")
+            handler = self.default
+        self[node_type] = handler
+        return handler
+
+    def __call__(self, owner, node):
+        return self[type(node)](owner, node)
+
+    def copy(self) -> "TypeDispatch":
+        table = TypeDispatch(self.default)
+        table.update(self)
+        return table
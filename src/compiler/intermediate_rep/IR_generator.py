@@ -1,18 +1,25 @@
 from dataclasses import dataclass, field
 from enum import Enum, auto
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
 from ..ast_nodes import *
+from ..dispatch import TypeDispatch
 from ..symbol_table import Symbol, SymbolTable
 from .arithmetic import IRArithmetic
+from .fragment_cache import ProcedureFragment, ProcedureIRCache
 from .IR_ops import *
 from .procinfo import ProcInfo
 
 
 
 class IRGenerator:
-    def __init__(self, symbol_table: SymbolTable):
+    # Command handlers by AST node type; unknown commands generate nothing
+    commands = TypeDispatch(default=lambda self, cmd: None)
+
+    def __init__(self, symbol_table: SymbolTable, fragment_cache: Optional[ProcedureIRCache] = None):
         self.symbol_table = symbol_table
+        self.fragment_cache = fragment_cache
+        self.touched: Optional[Dict[str, None]] = None  # names used by the procedure being cached
         self.temp_counter = 0
         self.label_manager = LabelManager()
         self.code: List[IRInstruction] = []
@@ -37,6 +44,8 @@ class IRGenerator:
         var_name = str(name)
         if self.current_proc and not var_name.startswith(self.current_proc + "#") and not is_const and not is_temp:
             var_name = f"{self.current_proc}#{name}"
+        if self.touched is not None and var_name not in self.touched:
+            self.touched[var_name] = None
             
         if var_name not in self.variables:
             
@@ -62,14 +71,32 @@ class IRGenerator:
                 
             else:                
                 var = Variable(name=var_name, proc_name=proc_name)
-            self.variables[var_name] = var
-            return var            
+            return register_variable(self.variables, var_name, var)            
         
         return self.variables[var_name]
 
     def generate(self, node: Program) -> List[IRInstruction]:
         """Generate IR for entire program"""
-        
+        code = []
+        for chunk in self.iter_generate(node):
+            code.extend(chunk)
+        self.code = code
+        return self.code, self.variables, self.proc_info
+
+    def iter_generate(
+        self,
+        node: Program,
+        release: bool = False,
+        fragments: Optional[Iterator[ProcedureFragment]] = None,
+    ) -> Iterator[List[IRInstruction]]:
+        """
+        Generate IR in chunks: the program entry with the arithmetic
+        procedures, each procedure in turn, then the main program. Variables
+        and proc_info accumulate as usual. With release, each procedure's AST
+        is dropped from node once its IR is out. fragments, if given, supplies
+        every procedure already generated elsewhere (see capture_procedure),
+        in order; they are spliced in instead.
+        """
         glob_temp = self.create_variable("global##temp", is_temp=True)
         
         
@@ -92,10 +119,16 @@ class IRGenerator:
         
         if self.costly_ops:
             self.code.extend(self.arithmetic.generate_arithmetic_procedures(self.costly_ops))
-              
+        yield self._take_code()
             
-        for proc in node.procedures:
-            self._generate_procedure(proc)
+        for i, proc in enumerate(node.procedures):
+            if fragments is not None:
+                self._splice_fragment(proc.name, next(fragments))
+            else:
+                self._generate_procedure(proc)
+            if release:
+                node.procedures[i] = None
+            yield self._take_code()
         
         # zero_var = self.create_variable(0, is_const=True)
         # one_var = self.create_variable(1, is_const=True)
@@ -116,13 +149,66 @@ class IRGenerator:
         for cmd in node.commands:
             self._generate_command(cmd)
             
-            
-        return self.code, self.variables, self.proc_info
+        yield self._take_code()
+
+    def _take_code(self) -> List[IRInstruction]:
+        code, self.code = self.code, []
+        return code
         
     def _generate_procedure(self, proc: Procedure) -> None:
-        """Generate IR for procedure definition"""       
+        """Generate IR for procedure definition, reusing a cached fragment if possible"""
+        if self.fragment_cache is None:
+            self._emit_procedure(proc)
+            return
+
+        # Key first: generating the body rewrites its conditions in place
+        key = self.fragment_cache.key(proc, self.symbol_table, self.costly_ops)
+        fragment = self.fragment_cache.get(key)
+        if fragment is not None:
+            self._splice_fragment(proc.name, fragment)
+            return
+
+        self.fragment_cache.put(key, self.capture_procedure(proc))
+
+    def capture_procedure(self, proc: Procedure) -> ProcedureFragment:
+        """Generate IR for a procedure and return it as a relocatable fragment"""
+        label_base = self.label_manager.counter
+        temp_base = self.temp_counter
+        code_start = len(self.code)
+        self.touched = {}
+        try:
+            self._emit_procedure(proc)
+            touched = self.touched
+        finally:
+            self.touched = None
+
+        return ProcedureFragment(
+            code=self.code[code_start:],
+            variables=[(name, self.variables[name]) for name in touched],
+            labels=[
+                self.label_manager.get_label_info(label)
+                for label in range(label_base + 1, self.label_manager.counter + 1)
+            ],
+            temps=self.temp_counter - temp_base,
+            proc_info=self.proc_info[proc.name],
+            label_base=label_base,
+            temp_base=temp_base,
+        )
+
+    def _splice_fragment(self, proc_name: str, fragment: ProcedureFragment) -> None:
+        """Append a cached procedure as if it had just been generated"""
+        fragment = fragment.relocated(self.label_manager.counter, self.temp_counter)
+        fragment = fragment.bound(self.variables)
+        for label_type, comment in fragment.labels:
+            self.label_manager.new_label(label_type, comment)
+        self.temp_counter += fragment.temps
+        self.proc_info[proc_name] = fragment.proc_info
+        self.code.extend(fragment.code)
+
+    def _emit_procedure(self, proc: Procedure) -> None:
               
         self.current_proc = proc.name       
+        start = len(self.code)
                 
         proc_label = self.label_manager.new_label(
             LabelType.PROC_START, f"{proc.name} procedure"
@@ -147,6 +233,7 @@ class IRGenerator:
         self.code.append(
             IRReturn(return_variable=ret, comment=f"End of procedure {proc.name}")
         )
+        self._locate(start, proc.location)
         
         self.current_proc = None
         
@@ -199,23 +286,18 @@ class IRGenerator:
         
 
     def _generate_command(self, cmd: Command) -> None:
-        if isinstance(cmd, Assignment):
-            self._generate_assignment(cmd)
-        elif isinstance(cmd, IfStatement):
-            self._generate_if(cmd)
-        elif isinstance(cmd, WhileLoop):
-            self._generate_while(cmd)
-        elif isinstance(cmd, RepeatLoop):
-            self._generate_repeat(cmd)
-        elif isinstance(cmd, ForLoop):
-            self._generate_for(cmd)
-        elif isinstance(cmd, ProcedureCall):
-            self._generate_proc_call(cmd)
-        elif isinstance(cmd, ReadCommand):
-            self._generate_read(cmd)
-        elif isinstance(cmd, WriteCommand):
-            self._generate_write(cmd)
-
+        start = len(self.code)
+        self.commands[type(cmd)](self, cmd)
+        # Nested commands have tagged their own code already
+        self._locate(start, cmd.location)
+
+    def _locate(self, start: int, location: Location) -> None:
+        """Set location on the instructions from start on that have none yet."""
+        for instruction in self.code[start:]:
+            if instruction.location is None:
+                instruction.location = location
+
+    @commands.register(Assignment)
     def _generate_assignment(self, cmd: Assignment) -> None:
         if isinstance(cmd.target, Identifier) and cmd.target.array_index is not None:
             # Handle array assignment
@@ -404,6 +486,7 @@ class IRGenerator:
             raise ValueError(f"Unsupported operator: {op.operator}")
     
 
+    @commands.register(IfStatement)
     def _generate_if(self, cmd: IfStatement) -> None:
         else_label = self.label_manager.new_label(
             LabelType.IF_ELSE,
@@ -508,6 +591,7 @@ class IRGenerator:
                 )
             )
 
+    @commands.register(WhileLoop)
     def _generate_while(self, cmd: WhileLoop) -> None:
         start_label = self.label_manager.new_label(
             LabelType.WHILE_START,
@@ -615,6 +699,7 @@ class IRGenerator:
                 )
             )
 
+    @commands.register(RepeatLoop)
     def _generate_repeat(self, cmd: RepeatLoop) -> None:
         start_label = self.label_manager.new_label(
             LabelType.REPEAT_START,
@@ -698,6 +783,7 @@ class IRGenerator:
             ))
                     
 
+    @commands.register(ForLoop)
     def _generate_for(self, cmd: ForLoop) -> None:
         start_label = self.label_manager.new_label(
             LabelType.FOR_START,
@@ -709,7 +795,7 @@ class IRGenerator:
         )
 
         # Initialize loop variable
-        iterator = BY_VALUE(self.create_variable(cmd.iterator))
+        iterator = wrap_by_value(self.create_variable(cmd.iterator))
         start_val = self._generate_value(cmd.start)
         # iterator_low = self.create_variable("iterator_low", is_temp=True)
         if start_val.is_pointer:
@@ -726,7 +812,7 @@ class IRGenerator:
         iterator_end = self.create_variable(name=f"t{self.temp_counter + 1}", is_temp=True)
         self.code.append(
             IRAssign(
-                target=BY_VALUE(iterator_end),
+                target=wrap_by_value(iterator_end),
                 value=end_val,
                 comment=f"Initialize for loop iterator end {iterator_end}",
             )
@@ -808,6 +894,7 @@ class IRGenerator:
             )
         )
 
+    @commands.register(ProcedureCall)
     def _generate_proc_call(self, cmd: ProcedureCall) -> None:
         args = []
         proc_params = self.symbol_table.get_procedure_params(cmd.name)
@@ -875,8 +962,9 @@ class IRGenerator:
         )
         
         
-        return BY_VALUE(temp)
+        return wrap_by_value(temp)
 
+    @commands.register(ReadCommand)
     def _generate_read(self, cmd: ReadCommand) -> None:
         target = self.create_variable(cmd.target.name)
         
@@ -912,6 +1000,7 @@ class IRGenerator:
                 target = wrap_by_value(target)
             self.code.append(IRRead(target=target, comment=f"Read value into {target}"))
             
+    @commands.register(WriteCommand)
     def _generate_write(self, cmd: WriteCommand) -> None:
         value = self._generate_value(cmd.value)
         if value.is_pointer:
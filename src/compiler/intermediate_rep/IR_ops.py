@@ -1,4 +1,4 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from enum import Enum, auto
 from typing import Dict, List, Optional, Set, Tuple
 from ..ast_nodes import *
@@ -19,7 +19,7 @@ class LabelType(Enum):
     PROC_END = auto()
     MAIN_START = auto()
     
-@dataclass
+@dataclass(slots=True)
 class Variable:
     """Enhanced variable representation for IR"""
     name: str
@@ -34,8 +34,14 @@ class Variable:
     # Array info
     array_start: Optional[int] = None
     array_size: Optional[int] = None  # end - start + 1
-    
-    
+
+    # Position in the program's variable table, see register_variable
+    id: int = field(default=-1, repr=False, compare=False)
+
+    # Views handed out by wrap_by_value / wrap_by_reference
+    _by_value: Optional["Variable"] = field(default=None, init=False, repr=False, compare=False)
+    _by_reference: Optional["Variable"] = field(default=None, init=False, repr=False, compare=False)
+
     def __str__(self) -> str:
         """String representation for IR code generation"""
 
@@ -60,6 +66,20 @@ class Variable:
             
         return f"{str(self)} ({', '.join(parts)})"
     
+    def __reduce__(self):
+        # Fragments come back pickled from --per-procedure -j workers; the
+        # constructor arguments are cheaper to rebuild from than per-slot
+        # state, and leave the views behind
+        return type(self), tuple([getattr(self, name) for name in self.__match_args__])
+
+    def renamed(self, name: str) -> 'Variable':
+        """A copy of this variable under another name, with views of its own."""
+        return replace(self, name=name)
+
+    def with_id(self, id: int) -> 'Variable':
+        """A copy of this variable at another place in the variable table."""
+        return replace(self, id=id)
+
     @staticmethod
     def create_temp(temp_name: str, proc_name: Optional[str] = None, is_pointer: Optional[bool] = False) -> 'Variable':
         return Variable(
@@ -92,71 +112,100 @@ class Variable:
     
     
     
-def wrap_by_value(var: Variable) -> Variable:
-    if isinstance(var, BY_VALUE):
-        return var
-    # elif isinstance(var, BY_REFERENCE):
-    #     raise ValueError(f"Variable {var} is already a reference")
-    else:
-        return BY_VALUE(var)
-    
-def wrap_by_reference(var: Variable) -> Variable:
-    if isinstance(var, BY_REFERENCE):
-        return var
-    # elif isinstance(var, BY_VALUE):
-        # raise ValueError(f"Variable {var} is already a value")
-    else:
-        return BY_REFERENCE(var)
-    
-@dataclass
-class BY_VALUE(Variable):
-    """Enhanced variable representation for IR"""
-    
+class _AccessView(Variable):
+    """
+    A variable seen through an access mode. Views hold nothing but the
+    variable they wrap and read every field through it; each variable has
+    at most one view per mode, so wrapping an operand allocates nothing
+    after its first use.
+    """
+
+    __slots__ = ("var",)
+
     def __init__(self, var: Variable):
-        # Copy all attributes from the wrapped variable
-        super().__init__(
-            name=var.name,
-            proc_name=var.proc_name,
-            is_temp=var.is_temp,
-            is_const=var.is_const,
-            const_value=var.const_value,
-            is_array=var.is_array,
-            is_pointer=var.is_pointer,
-            array_start=var.array_start,
-            array_size=var.array_size
-        )
-    
+        self.var = var.var if isinstance(var, _AccessView) else var
+
+    def __reduce__(self):
+        # The inherited field slots are read-only here; rebuild from var
+        return type(self), (self.var,)
+
+
+def _forward(name: str) -> property:
+    return property(lambda self: getattr(self.var, name))
+
+
+for _name in Variable.__dataclass_fields__:
+    setattr(_AccessView, _name, _forward(_name))
+
+
+class BY_VALUE(_AccessView):
+    __slots__ = ()
+
     def __str__(self):
         return f"BY_VALUE {super().__str__()}"
-    
+
     def print_full(self):
         return f"BY_VALUE {super().print_full()}"
-    
-@dataclass
-class BY_REFERENCE(Variable):
-    def __init__(self, var: Variable):
-        # Copy all attributes from the wrapped variable
-        super().__init__(
-            name=var.name,
-            proc_name=var.proc_name,
-            is_temp=var.is_temp,
-            is_const=var.is_const,
-            const_value=var.const_value,
-            is_array=var.is_array,
-            is_pointer=var.is_pointer,
-            array_start=var.array_start,
-            array_size=var.array_size
-        )
-    
+
+
+class BY_REFERENCE(_AccessView):
+    __slots__ = ()
+
     def __str__(self):
         return f"BY REFERENCE{super().__str__()}"
-    
+
     def print_full(self):
         return f"BY REFERENCE{super().print_full()}"
 
 
+def wrap_by_value(var: Variable) -> Variable:
+    if isinstance(var, BY_VALUE):
+        return var
+    if isinstance(var, _AccessView):
+        var = var.var
+    if var._by_value is None:
+        var._by_value = BY_VALUE(var)
+    return var._by_value
+
+
+def wrap_by_reference(var: Variable) -> Variable:
+    if isinstance(var, BY_REFERENCE):
+        return var
+    if isinstance(var, _AccessView):
+        var = var.var
+    if var._by_reference is None:
+        var._by_reference = BY_REFERENCE(var)
+    return var._by_reference
+
+
+def register_variable(
+    variables: Dict[str, Variable], name: str, var: Variable, in_place: bool = False
+) -> Variable:
+    """
+    Add a new variable to a program's variable table. Its id becomes its
+    position there, which is what MemoryMap indexes addresses by. var is
+    not changed, as it may be shared (ArithmeticVars defaults, cached
+    fragments): unless it already has that id, a copy with it, in the
+    same access mode, is registered. Use the returned variable from then on.
+    With in_place, var is known to be referenced from nowhere else and
+    takes the id itself.
+    """
+    id = len(variables)
+    base = var.var if isinstance(var, _AccessView) else var
+    if in_place:
+        base.id = id
+    elif base.id != id:
+        base = base.with_id(id)
+        if isinstance(var, BY_VALUE):
+            var = wrap_by_value(base)
+        elif isinstance(var, BY_REFERENCE):
+            var = wrap_by_reference(base)
+        else:
+            var = base
+    variables[name] = var
+    return var
+
 
-    
 class LabelManager:
     """Manages label creation and tracking"""
     def __init__(self):
@@ -181,6 +230,10 @@ class IRInstruction:
     """Base class for IR instructions"""
     comment: str
 
+    # Source position of the command this was generated for, if any; set by
+    # IRGenerator, kept out of the fields so it never changes equality
+    location = None
+
 @dataclass
 class IRHalt(IRInstruction):
     comment: str = ""
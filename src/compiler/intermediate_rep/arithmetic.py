@@ -6,26 +6,26 @@ from .procinfo import ProcInfo
 @dataclass
 class ArithmeticVars:
     """Container for arithmetic variables"""
-    arg1: Variable = BY_VALUE(Variable("arg1"))
-    arg2: Variable = BY_VALUE(Variable("arg2"))
-    result: Variable = BY_VALUE(Variable("result"))
-    result2: Variable = BY_VALUE(Variable("result2"))  # Used for remainder in division
-    sign1: Variable = BY_VALUE(Variable("sign1"))
-    sign2: Variable = BY_VALUE(Variable("sign2"))
-    temp: Variable = BY_VALUE(Variable("temp"))
-    zero: Variable = BY_VALUE(Variable("0", is_const=True, const_value=0))
-    one: Variable = BY_VALUE(Variable("1", is_const=True, const_value=1))
-    minus_one: Variable = BY_VALUE(Variable("-1", is_const=True, const_value=-1))
-    divisor_copy: Variable = BY_VALUE(Variable("divisor_copy"))
-    abs_return: Variable = BY_VALUE(Variable("abs#return"))
-    mul_return: Variable = BY_VALUE(Variable("mul#return"))
-    div_return: Variable = BY_VALUE(Variable("div#return"))
+    arg1: Variable = wrap_by_value(Variable("arg1"))
+    arg2: Variable = wrap_by_value(Variable("arg2"))
+    result: Variable = wrap_by_value(Variable("result"))
+    result2: Variable = wrap_by_value(Variable("result2"))  # Used for remainder in division
+    sign1: Variable = wrap_by_value(Variable("sign1"))
+    sign2: Variable = wrap_by_value(Variable("sign2"))
+    temp: Variable = wrap_by_value(Variable("temp"))
+    zero: Variable = wrap_by_value(Variable("0", is_const=True, const_value=0))
+    one: Variable = wrap_by_value(Variable("1", is_const=True, const_value=1))
+    minus_one: Variable = wrap_by_value(Variable("-1", is_const=True, const_value=-1))
+    divisor_copy: Variable = wrap_by_value(Variable("divisor_copy"))
+    abs_return: Variable = wrap_by_value(Variable("abs#return"))
+    mul_return: Variable = wrap_by_value(Variable("mul#return"))
+    div_return: Variable = wrap_by_value(Variable("div#return"))
     
     
     #debugVariables
-    debug1: Variable = BY_VALUE(Variable("202", is_const=True, const_value=202))
-    debug2: Variable = BY_VALUE(Variable("404", is_const=True, const_value=404))
-    debug3: Variable = BY_VALUE(Variable("606", is_const=True, const_value=606))
+    debug1: Variable = wrap_by_value(Variable("202", is_const=True, const_value=202))
+    debug2: Variable = wrap_by_value(Variable("404", is_const=True, const_value=404))
+    debug3: Variable = wrap_by_value(Variable("606", is_const=True, const_value=606))
 
 class IRArithmetic:
     """
@@ -45,8 +45,9 @@ class IRArithmetic:
                 
 
     def _init_arithmetic_vars(self):
-        for var in self.vars.__dict__.values():
-            self.variables[var.name] = BY_VALUE(var)
+        # The defaults are shared by every instance: register copies of them
+        for field_name, var in vars(self.vars).items():
+            setattr(self.vars, field_name, register_variable(self.variables, var.name, var))
 
     def generate_arithmetic_procedures(self, costly_operations: set) -> List[IRInstruction]:
         """Generate all arithmetic procedures"""
@@ -265,10 +266,10 @@ class IRArithmetic:
 
         code.append(
             IRAssign(
-                target=Variable("temp"), value=vars.arg2, comment="Hold arg2 for halving"
+                target=vars.temp, value=vars.arg2, comment="Hold arg2 for halving"
             )
         )
-        code.append(IRHalf(target=Variable("temp"), comment="Halve arg2"))
+        code.append(IRHalf(target=vars.temp, comment="Halve arg2"))
         code.append(
             IRBinaryOp(
                 target=vars.temp,
@@ -0,0 +1,224 @@
+import copy
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, fields, is_dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..ast_nodes import *
+from .IR_ops import *
+from .procinfo import ProcInfo
+
+DEFAULT_MAX_ENTRIES = 1024
+
+_TEMP_NAME = re.compile(r"t(\d+)$")
+# Instruction fields holding label ids
+_LABEL_FIELDS = ("label_id", "label")
+
+
+def ast_fingerprint(node: Any) -> str:
+    """
+    Canonical text of an AST subtree. Locations are left out, so moving a
+    procedure around the file (or editing the code above it) keeps its
+    fingerprint.
+    """
+    if is_dataclass(node):
+        parts = [
+            f"{f.name}={ast_fingerprint(getattr(node, f.name))}"
+            for f in fields(node)
+            if f.name != "location"
+        ]
+        return f"{type(node).__name__}({','.join(parts)})"
+    if isinstance(node, (list, tuple)):
+        return "[" + ",".join(ast_fingerprint(item) for item in node) + "]"
+    return repr(node)
+
+
+def called_procedures(commands: List[Command]) -> List[str]:
+    """Names of the procedures called anywhere in commands, in call order."""
+    names = []
+    for cmd in commands:
+        if isinstance(cmd, ProcedureCall):
+            names.append(cmd.name)
+        elif isinstance(cmd, IfStatement):
+            names.extend(called_procedures(cmd.then_block))
+            names.extend(called_procedures(cmd.else_block or []))
+        elif isinstance(cmd, (WhileLoop, RepeatLoop, ForLoop)):
+            names.extend(called_procedures(cmd.body))
+    return names
+
+
+@dataclass
+class ProcedureFragment:
+    """
+    IR generated for one procedure, together with what it added to the
+    generator's shared state. label_base and temp_base are the label and
+    temp counters it was generated at; ids above them are relocated when
+    the fragment is spliced in at other counters. An owned fragment's
+    variables are referenced from nowhere else (it came from a worker
+    process), so splicing renames and numbers them in place instead of
+    copying them.
+    """
+
+    code: List[IRInstruction]
+    variables: List[Tuple[str, Variable]]  # every name it touched, in first-use order
+    labels: List[Tuple[LabelType, str]]  # labels it created, in order
+    temps: int  # number of temps it created
+    proc_info: ProcInfo
+    label_base: int
+    temp_base: int
+    owned: bool = False
+
+    def relocated(self, label_base: int, temp_base: int) -> "ProcedureFragment":
+        """This fragment with its labels and temps moved to the given counters."""
+        label_delta = label_base - self.label_base
+        temp_delta = temp_base - self.temp_base
+        if not label_delta and not temp_delta:
+            return self
+        if self.owned and not self.code:
+            return self._moved_in_place(label_delta, label_base, temp_base)
+
+        renamed: Dict[int, Variable] = {}
+
+        def move_variable(var):
+            if not isinstance(var, Variable) or not var.is_temp:
+                return var
+            match = _TEMP_NAME.match(var.name)
+            if not match or int(match.group(1)) <= self.temp_base:
+                return var
+            if isinstance(var, BY_VALUE):
+                return wrap_by_value(move_variable(var.var))
+            if isinstance(var, BY_REFERENCE):
+                return wrap_by_reference(move_variable(var.var))
+            if id(var) not in renamed:
+                renamed[id(var)] = var.renamed(f"t{int(match.group(1)) + temp_delta}")
+            return renamed[id(var)]
+
+        return self._rewritten(move_variable, label_delta, label_base, temp_base)
+
+    def bound(self, table: Dict[str, Variable]) -> "ProcedureFragment":
+        """
+        Add the variables this fragment touched to a program's variable
+        table, and return it with its code using the table's variables.
+        Ones the table already has are shared; new ones are registered,
+        as copies when their id from the program the fragment was
+        generated in doesn't match their place in this one.
+        """
+        rebound: Dict[int, Variable] = {}
+        for name, var in self.variables:
+            target = table.get(name)
+            if target is None:
+                target = register_variable(table, name, var, in_place=self.owned)
+            if target is not var:
+                rebound[id(var)] = target
+        if not rebound:
+            return self
+
+        def move_variable(var):
+            if not isinstance(var, Variable):
+                return var
+            if isinstance(var, BY_VALUE):
+                return wrap_by_value(move_variable(var.var))
+            if isinstance(var, BY_REFERENCE):
+                return wrap_by_reference(move_variable(var.var))
+            return rebound.get(id(var), var)
+
+        return self._rewritten(move_variable, 0, self.label_base, self.temp_base)
+
+    def _moved_in_place(self, label_delta: int, label_base: int, temp_base: int) -> "ProcedureFragment":
+        """relocated() of an owned fragment with no code: temps are renamed where they are."""
+        temp_delta = temp_base - self.temp_base
+        renamed: Dict[int, Tuple[str, str]] = {}  # old and new name
+        variables = []
+        for name, var in self.variables:
+            base = var.var if isinstance(var, (BY_VALUE, BY_REFERENCE)) else var
+            if id(base) not in renamed:
+                old = base.name
+                match = _TEMP_NAME.match(old) if base.is_temp else None
+                if match and int(match.group(1)) > self.temp_base:
+                    base.name = f"t{int(match.group(1)) + temp_delta}"
+                renamed[id(base)] = (old, base.name)
+            old, new = renamed[id(base)]
+            variables.append((new if name == old else name, var))
+        self.variables = variables
+        self.proc_info.begin_id += label_delta
+        self.label_base = label_base
+        self.temp_base = temp_base
+        return self
+
+    def _rewritten(self, move_variable, label_delta: int, label_base: int, temp_base: int) -> "ProcedureFragment":
+        """This fragment with move_variable applied to its operands and labels shifted."""
+
+        def move_instruction(instr: IRInstruction) -> IRInstruction:
+            moved = copy.copy(instr)
+            for f in fields(instr):
+                value = getattr(instr, f.name)
+                if f.name in _LABEL_FIELDS and isinstance(value, int):
+                    setattr(moved, f.name, value + label_delta)
+                elif isinstance(value, Variable):
+                    setattr(moved, f.name, move_variable(value))
+                elif isinstance(value, list):
+                    setattr(moved, f.name, [move_variable(item) for item in value])
+            return moved
+
+        variables = []
+        for name, var in self.variables:
+            moved = move_variable(var)
+            if moved is not var and name == var.name:
+                name = moved.name
+            variables.append((name, moved))
+
+        proc_info = ProcInfo(
+            begin_id=self.proc_info.begin_id + label_delta,
+            arguments=[move_variable(var) for var in self.proc_info.arguments],
+            return_var=move_variable(self.proc_info.return_var),
+        )
+
+        return ProcedureFragment(
+            code=[move_instruction(instr) for instr in self.code],
+            variables=variables,
+            labels=self.labels,
+            temps=self.temps,
+            proc_info=proc_info,
+            label_base=label_base,
+            temp_base=temp_base,
+        )
+
+
+class ProcedureIRCache:
+    """
+    In-memory LRU store of ProcedureFragments, meant to live as long as the
+    pipeline so recompiling an edited program only regenerates the
+    procedures that changed. A fragment is keyed by the procedure's AST,
+    the signatures of the procedures it calls and the set of operations
+    compiled as runtime calls, which is everything IRGenerator consults
+    while generating a procedure body.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.fragments: "OrderedDict[str, ProcedureFragment]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, proc: Procedure, symbol_table, costly_ops) -> str:
+        digest = hashlib.sha256(ast_fingerprint(proc).encode())
+        for name in sorted(set(called_procedures(proc.commands))):
+            digest.update(f"|{name}{symbol_table.get_procedure_params(name)}".encode())
+        digest.update(f"|{sorted(costly_ops)}".encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[ProcedureFragment]:
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            self.misses += 1
+            return None
+        self.fragments.move_to_end(key)
+        self.hits += 1
+        return fragment
+
+    def put(self, key: str, fragment: ProcedureFragment) -> None:
+        self.fragments[key] = fragment
+        self.fragments.move_to_end(key)
+        while len(self.fragments) > self.max_entries:
+            self.fragments.popitem(last=False)
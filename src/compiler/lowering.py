@@ -0,0 +1,102 @@
+# src/compiler/lowering.py
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import replace
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from .ast_nodes import Procedure
+from .intermediate_rep.arithmetic import ArithmeticVars
+from .intermediate_rep.fragment_cache import ProcedureFragment, called_procedures
+from .intermediate_rep.IR_generator import IRGenerator
+from .intermediate_rep.IR_ops import Variable
+from .intermediate_rep.procinfo import ProcInfo
+from .symbol_table import SymbolTable
+from .vm_compiler.linker import ProcLabel, RelocatableObject, RelocatingMemoryMap, relocatable_object
+from .vm_compiler.vm_code_generator import VMCodeGenerator
+
+# Procedures per task sent to a worker
+MAX_CHUNK = 64
+
+# Set in each worker process by init_lowering_worker
+_symbol_table: Optional[SymbolTable] = None
+_routines: Dict[str, ProcInfo] = {}
+
+
+def init_lowering_worker(symbol_table: SymbolTable) -> None:
+    global _symbol_table, _routines
+    _symbol_table = symbol_table
+    _routines = routine_proc_info()
+
+
+def lower_in_pool(
+    procedures: List[Procedure], symbol_table: SymbolTable, jobs: int
+) -> Iterator[Tuple[ProcedureFragment, RelocatableObject]]:
+    """
+    lower_procedure() over procedures in jobs worker processes, results in
+    order. Unlike Executor.map, which submits everything at once, only a
+    few chunks are in flight at a time: results don't pile up in the
+    parent waiting to be spliced, where every full garbage collection
+    would walk them, and procedures are pickled as they are needed.
+    """
+    chunksize = max(1, min(MAX_CHUNK, len(procedures) // (jobs * 8)))
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=init_lowering_worker, initargs=(symbol_table,)
+    ) as pool:
+        in_flight: Deque[Future] = deque()
+        for start in range(0, len(procedures), chunksize):
+            in_flight.append(pool.submit(lower_procedures, procedures[start : start + chunksize]))
+            if len(in_flight) > 2 * jobs:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def lower_procedures(procedures: List[Procedure]) -> List[Tuple[ProcedureFragment, RelocatableObject]]:
+    return [lower_procedure(proc) for proc in procedures]
+
+
+def routine_proc_info() -> Dict[str, ProcInfo]:
+    """ProcInfo of the arithmetic routines, as seen by code calling them."""
+    vars = ArithmeticVars()
+    return {
+        "abs": ProcInfo(ProcLabel("abs"), [], vars.abs_return),
+        "mul": ProcInfo(ProcLabel("mul"), [], vars.mul_return),
+        "div": ProcInfo(ProcLabel("div"), [], vars.div_return),
+    }
+
+
+def external_proc_info(name: str, symbol_table: SymbolTable) -> ProcInfo:
+    """ProcInfo of a user procedure generated elsewhere, as seen by its callers."""
+    return ProcInfo(
+        begin_id=ProcLabel(name),
+        arguments=[
+            Variable(name=f"{name}#{param}", proc_name=name, is_pointer=True)
+            for param, _ in symbol_table.get_procedure_params(name)
+        ],
+        return_var=Variable(name=f"{name}#return", proc_name=name),
+    )
+
+
+def lower_procedure(proc: Procedure) -> Tuple[ProcedureFragment, RelocatableObject]:
+    """
+    Generate IR and VM code for one procedure in isolation, starting from
+    label and temp 0. Returns the fragment without its IR, which the
+    parent splices into its IRGenerator for the bookkeeping (variables,
+    labels, temps, proc_info), and the relocatable VM code. The parent
+    gets its own unpickled copy of the fragment, so it is marked owned.
+    """
+    generator = IRGenerator(_symbol_table)
+    generator.proc_info.update(_routines)
+    for name in set(called_procedures(proc.commands)):
+        generator.proc_info[name] = external_proc_info(name, _symbol_table)
+
+    fragment = generator.capture_procedure(proc)
+    symbols = RelocatingMemoryMap()
+    code_gen = VMCodeGenerator(
+        symbols, generator.variables, generator.proc_info,
+        costly_ops=_symbol_table.costly_operations,
+    )
+    code = (op for instruction in fragment.code for op in code_gen.compile_ir(instruction))
+    obj = relocatable_object(code, symbols)
+    obj.ir_instructions = len(fragment.code)
+    return replace(fragment, code=[], owned=True), obj
@@ -2,10 +2,12 @@ import os
 import subprocess
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Iterable, List, Optional, Tuple, Union
 
 import tree_sitter_jftt as jftt
-from tree_sitter import Language, Parser  # type: ignore
+from tree_sitter import Language, Parser, Query, QueryCursor  # type: ignore
+
+from .source import Source
 
 
 @dataclass
@@ -15,6 +17,115 @@ class SyntaxError:
     column: int
     source_line: str
     length: int
+    start_byte: int = 0
+    end_byte: int = 0
+
+
+@dataclass
+class SourceEdit:
+    """
+    A single text edit, described the way tree-sitter wants it: byte offsets
+    plus (row, column) points, all zero-based, columns counted in bytes.
+    """
+
+    start_byte: int
+    old_end_byte: int
+    new_end_byte: int
+    start_point: Tuple[int, int]
+    old_end_point: Tuple[int, int]
+    new_end_point: Tuple[int, int]
+
+    @staticmethod
+    def from_replacement(
+        old_source: bytes, start_byte: int, old_end_byte: int, new_text: bytes
+    ) -> "SourceEdit":
+        """Describe replacing old_source[start_byte:old_end_byte] with new_text."""
+
+        def point_at(offset: int) -> Tuple[int, int]:
+            row = old_source.count(b"\n", 0, offset)
+            return row, offset - (old_source.rfind(b"\n", 0, offset) + 1)
+
+        start_point = point_at(start_byte)
+        newlines = new_text.count(b"\n")
+        if newlines:
+            new_end_point = (
+                start_point[0] + newlines,
+                len(new_text) - (new_text.rfind(b"\n") + 1),
+            )
+        else:
+            new_end_point = (start_point[0], start_point[1] + len(new_text))
+
+        return SourceEdit(
+            start_byte=start_byte,
+            old_end_byte=old_end_byte,
+            new_end_byte=start_byte + len(new_text),
+            start_point=start_point,
+            old_end_point=point_at(old_end_byte),
+            new_end_point=new_end_point,
+        )
+
+    def apply(self, old_source: bytes, new_text: bytes) -> bytes:
+        """Produce the edited source."""
+        return old_source[: self.start_byte] + new_text + old_source[self.old_end_byte :]
+
+
+def _as_bytes(code: Source) -> bytes:
+    # bytes and mmap buffers go to tree-sitter as they are
+    return code.encode("utf8") if isinstance(code, str) else code
+
+
+def _line_text(source: bytes, offset: int) -> Optional[str]:
+    """Text of the line containing offset, or None past the last line."""
+    if offset >= len(source) and (not len(source) or source[-1:] == b"\n"):
+        return None
+    start = source.rfind(b"\n", 0, offset) + 1
+    end = source.find(b"\n", offset)
+    if end == -1:
+        end = len(source)
+    return source[start:end].rstrip(b"\r").decode("utf8", errors="replace")
+
+
+def _overlaps(start: int, end: int, ranges: List[Tuple[int, int]]) -> bool:
+    # Inclusive on both ends, so zero-width (MISSING) nodes on a boundary count
+    return any(start <= range_end and end >= range_start for range_start, range_end in ranges)
+
+
+def _merged(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sort ranges and join the ones that overlap or touch."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+# Smallest units an edit is rescanned in; list nodes (commands, procedures)
+# are left-recursive and would drag in everything before the edit
+_STATEMENT_NODES = ("command", "proc_head", "declarations", "args_decl")
+
+_ERROR_QUERY = "(ERROR) @error (MISSING) @error"
+
+
+def _enclosing_statement(root, start: int, end: int):
+    node = root.descendant_for_byte_range(start, end)
+    while node is not None and node.type not in _STATEMENT_NODES:
+        node = node.parent
+    return node
+
+
+def _token_start_before(root, source: bytes, offset: int) -> int:
+    """Start of the last token beginning before offset (offset if there is none)."""
+    # Find the token by its last byte: whitespace is the only text outside
+    # tokens, and descendant_for_byte_range gets there without walking the
+    # list nodes in Python
+    end = offset
+    while end and source[end - 1 : end].isspace():
+        end -= 1
+    if not end:
+        return offset
+    return min(root.descendant_for_byte_range(end - 1, end).start_byte, offset)
 
 
 class CompilerParser:
@@ -27,59 +138,195 @@ class CompilerParser:
 
             language = Language(jftt.language())
             self.parser = Parser(language)
+            self._error_query = Query(language, _ERROR_QUERY)
 
         except Exception as e:
             print(f"Error creating parser: {e}")
             raise
 
-    def parse(self, code: str) -> Tuple[Optional[object], List[SyntaxError]]:
+    def parse(self, code: Source) -> Tuple[Optional[object], List[SyntaxError]]:
         """Parse code and return the syntax tree along with any errors."""
         if not self.parser:
             raise RuntimeError("Parser not initialized")
 
-        tree = self.parser.parse(bytes(code, "utf8"))
-        errors = self._collect_errors(tree.root_node, code)
+        source = _as_bytes(code)
+        tree = self.parser.parse(source)
+        errors = self._collect_errors(tree.root_node, source)
         return tree, errors
 
-    def _collect_errors(self, node, source_code: str) -> List[SyntaxError]:
+    def parse_incremental(
+        self,
+        old_tree,
+        old_errors: List[SyntaxError],
+        new_code: Union[str, bytes],
+        edit: SourceEdit,
+    ) -> Tuple[Optional[object], List[SyntaxError]]:
+        """
+        Reparse after an edit, reusing the previous tree.
+        old_tree and old_errors must come from parsing the pre-edit source;
+        old_tree is edited in place. Only the ranges whose structure changed
+        (plus the edited span) are rescanned for errors, errors elsewhere are
+        carried over and shifted. The rescan reaches each range through
+        tree-sitter rather than by walking down to it, but tree-sitter still
+        rebuilds every list node above the edit, so with the left-recursive
+        command lists an edit costs more the further it is from the end of
+        its list.
+        """
+        if not self.parser:
+            raise RuntimeError("Parser not initialized")
+
+        source = _as_bytes(new_code)
+        old_tree.edit(
+            start_byte=edit.start_byte,
+            old_end_byte=edit.old_end_byte,
+            new_end_byte=edit.new_end_byte,
+            start_point=edit.start_point,
+            old_end_point=edit.old_end_point,
+            new_end_point=edit.new_end_point,
+        )
+        tree = self.parser.parse(source, old_tree)
+
+        regions = [(edit.start_byte, edit.new_end_byte)]
+        regions.extend((r.start_byte, r.end_byte) for r in old_tree.changed_ranges(tree))
+        regions = _merged(
+            [self._widen_region(tree.root_node, source, start, end) for start, end in regions]
+        )
+
         errors = []
-        source_lines = source_code.splitlines()
-
-        def collect_node_errors(node):
-
-            if str(node).startswith("(MISSING"):
-                line_num = node.start_point[0]
-                missing_token = str(node).split('"')[1]
-                if line_num < len(source_lines):
-                    source_line = source_lines[line_num]
-                    error = SyntaxError(
-                        message=f"Missing token: {missing_token}",
-                        line=line_num + 1,
-                        column=node.start_point[1],
-                        source_line=source_line,
-                        length=1,
-                    )
-                    errors.append(error)
-
-            if node.type == "ERROR":
-                line_num = node.start_point[0]
-                if line_num < len(source_lines):
-                    source_line = source_lines[line_num]
-                    error = SyntaxError(
-                        message=f"Unexpected syntax: '{node.text.decode('utf8')}'",
-                        line=line_num + 1,
-                        column=node.start_point[1],
-                        source_line=source_line,
-                        length=len(node.text.decode("utf8")),
-                    )
-                    errors.append(error)
-
-            for child in node.children:
-                collect_node_errors(child)
-
-        collect_node_errors(node)
+        for error in old_errors:
+            shifted = self._shift_error(error, edit, source)
+            if shifted and not _overlaps(shifted.start_byte, shifted.end_byte, regions):
+                errors.append(shifted)
+        errors.extend(self._collect_errors(tree.root_node, source, regions))
+        errors.sort(key=lambda error: error.start_byte)
+
+        return tree, errors
+
+    def _widen_region(self, root, source: bytes, start: int, end: int) -> Tuple[int, int]:
+        """
+        changed_ranges misses errors that hug a change: MISSING nodes are
+        zero-width and sit right after the preceding token, and tokens whose
+        role changed can keep their ancestors' types. Rescan the whole
+        enclosing statement and reach back to the token before it.
+        """
+        statement = _enclosing_statement(root, start, end)
+        if statement is not None:
+            start = min(start, statement.start_byte)
+            end = max(end, statement.end_byte)
+        return _token_start_before(root, source, start), end
+
+    def _shift_error(
+        self, error: SyntaxError, edit: SourceEdit, source: bytes
+    ) -> Optional[SyntaxError]:
+        """Move an error found before the edit to post-edit coordinates (None if it was edited)."""
+        if error.end_byte <= edit.start_byte and error.start_byte < edit.start_byte:
+            if error.line - 1 != edit.start_point[0]:
+                return error
+            # Same position, but the rest of its line was edited
+            return SyntaxError(
+                message=error.message,
+                line=error.line,
+                column=error.column,
+                source_line=_line_text(source, error.start_byte) or "",
+                length=error.length,
+                start_byte=error.start_byte,
+                end_byte=error.end_byte,
+            )
+        if error.start_byte < edit.old_end_byte:
+            return None
+
+        byte_delta = edit.new_end_byte - edit.old_end_byte
+        row = error.line - 1
+        column = error.column
+        if row == edit.old_end_point[0]:
+            column += edit.new_end_point[1] - edit.old_end_point[1]
+        row += edit.new_end_point[0] - edit.old_end_point[0]
+
+        start_byte = error.start_byte + byte_delta
+        source_line = error.source_line
+        if row == edit.new_end_point[0]:
+            # The edit touched this line, so its text has changed
+            source_line = _line_text(source, start_byte) or ""
+
+        return SyntaxError(
+            message=error.message,
+            line=row + 1,
+            column=column,
+            source_line=source_line,
+            length=error.length,
+            start_byte=start_byte,
+            end_byte=error.end_byte + byte_delta,
+        )
+
+    def _collect_errors(
+        self, node, source: bytes, ranges: Optional[List[Tuple[int, int]]] = None
+    ) -> List[SyntaxError]:
+        """Collect syntax errors below node, only looking inside ranges if given."""
+        errors = []
+        if not node.has_error:
+            return errors
+
+        nodes = self._error_nodes(node) if ranges is None else self._error_nodes_in(node, ranges)
+        for current in nodes:
+            source_line = _line_text(source, current.start_byte)
+            if source_line is None:
+                continue
+            if current.is_missing:
+                message, length = f"Missing token: {current.type}", 1
+            else:
+                text = current.text.decode("utf8")
+                message, length = f"Unexpected syntax: '{text}'", len(text)
+            errors.append(
+                SyntaxError(
+                    message=message,
+                    line=current.start_point[0] + 1,
+                    column=current.start_point[1],
+                    source_line=source_line,
+                    length=length,
+                    start_byte=current.start_byte,
+                    end_byte=current.end_byte,
+                )
+            )
         return errors
 
+    def _error_nodes(self, node) -> Iterable:
+        """ERROR and MISSING nodes below node, in document order."""
+        # Pre-order walk with a cursor; subtrees without has_error are
+        # skipped, so an error-free tree costs a single check. ERROR leaves
+        # nested in an ERROR node don't report has_error themselves.
+        cursor = node.walk()
+        depth = 0
+        while True:
+            current = cursor.node
+            descend = current.has_error or current.is_error
+            if descend and (current.is_missing or current.is_error):
+                yield current
+
+            if descend and cursor.goto_first_child():
+                depth += 1
+                continue
+            while depth and not cursor.goto_next_sibling():
+                cursor.goto_parent()
+                depth -= 1
+            if not depth:
+                return
+
+    def _error_nodes_in(self, node, ranges: List[Tuple[int, int]]) -> List:
+        """
+        ERROR and MISSING nodes below node that overlap ranges, in document
+        order. A query cursor limited to each range finds them without
+        stepping through the list nodes before it in Python.
+        """
+        found = {}
+        for start, end in ranges:
+            cursor = QueryCursor(self._error_query)
+            # A byte of slack on each side keeps nodes that only touch the range
+            cursor.set_byte_range(max(start - 1, 0), end + 1)
+            for current in cursor.captures(node).get("error", []):
+                if _overlaps(current.start_byte, current.end_byte, ranges):
+                    found[current.id] = current
+        return sorted(found.values(), key=lambda current: (current.start_byte, -current.end_byte))
+
     def format_error(self, error: SyntaxError) -> str:
         pointer = " " * error.column + "^" * error.length
         return f"""
@@ -0,0 +1,374 @@
+# src/compiler/pipeline.py
+import tempfile
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .ast_builder import ASTBuilder
+from .ast_nodes import Program
+from .cache import CompileCache
+from .intermediate_rep.fragment_cache import ProcedureIRCache
+from .intermediate_rep.IR_generator import IRGenerator
+from .intermediate_rep.IR_ops import IRInstruction
+from .lowering import lower_in_pool
+from .parser import CompilerParser
+from .pre_assembler.memory_map import MemoryMap
+from .profiling import CompileProfile, count_ast_nodes, profile_stage
+from .semantic_analyzer import SemanticAnalyzer
+from .source import LineTable, Source, source_bytes
+from .source_map import SourceMap
+from .symbol_table import SymbolTable
+from .vm_compiler.label_correct import correct_labels
+from .vm_compiler.linker import ObjectWriter, RelocatingMemoryMap, link
+from .vm_compiler.vm_code_generator import VMCodeGenerator
+from .vm_compiler.vm_operators import HALT
+
+WRITE_BUFFER = 2**20
+
+
+def format_error(message: str, line: int, column: int, source_lines: Sequence[str]) -> str:
+    source_line = source_lines[line - 1] if line <= len(source_lines) else ""
+    pointer = " " * column + "^"
+    return f"""
+Error at line {line}, column {column}:
+{message}
+{source_line}
+{pointer}
+"""
+
+
+def write_code(path: str, code: Iterable[str]) -> int:
+    """
+    Write generated VM code, one instruction per line, through a single
+    buffered writer. code may be a lazy stream; returns the line count.
+    """
+    count = 0
+    with open(path, "w", buffering=WRITE_BUFFER) as f:
+        for item in code:
+            f.write(item + "\n")
+            count += 1
+    return count
+
+
+class CompilationError(Exception):
+    """Raised when a program is rejected by one of the front-end stages."""
+
+    def __init__(self, stage: str, header: str, messages: List[str]):
+        self.stage = stage  # 'syntax', 'ast' or 'semantic'
+        self.header = header
+        self.messages = messages
+        super().__init__(header or "\n".join(messages))
+
+
+class CompilerPipeline:
+    """
+    Whole compilation pipeline:
+    CompilerParser -> ASTBuilder -> SemanticAnalyzer -> IRGenerator
+                   -> MemoryMap -> VMCodeGenerator
+
+    The parser (and its tree-sitter Language) is created once, so a single
+    instance can compile any number of programs without paying setup again.
+    With a CompileCache, compile() answers previously seen sources from the
+    cache without running any stage; from_cache tells whether the last
+    compile() was such a hit. With a ProcedureIRCache, procedure IR is
+    also kept between compiles, so after an edit only the changed
+    procedures are regenerated. Keying it costs a walk of every
+    procedure's AST, which only pays off when the same program comes back
+    edited (the compile server), not for one-shot or batch compiles.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[CompileCache] = None,
+        fragment_cache: Optional[ProcedureIRCache] = None,
+    ):
+        self.parser = CompilerParser()
+        self.ast_builder = ASTBuilder()
+        self.semantic_analyzer = SemanticAnalyzer()
+        self.cache = cache
+        self.fragment_cache = fragment_cache
+        self.options: Dict = {}  # everything besides the source that shapes the output
+        self.from_cache = False
+
+    def analyze(
+        self, source: Source, profile: Optional[CompileProfile] = None
+    ) -> Tuple[Program, SymbolTable]:
+        """
+        Run the front end (parse, AST, semantic analysis) on a source.
+        Bytes and memory-mapped sources are parsed without being copied.
+        """
+        source = source_bytes(source)
+        with profile_stage(profile, "parse"):
+            tree, syntax_errors = self.parser.parse(source)
+        if syntax_errors:
+            raise CompilationError(
+                "syntax",
+                "Compilation failed due to syntax errors!",
+                [self.parser.format_error(error) for error in syntax_errors],
+            )
+
+        try:
+            with profile_stage(profile, "ast"):
+                ast = self.ast_builder.build(tree.root_node, source)
+        except ValueError as e:
+            raise CompilationError("ast", "", [f"Error building AST: {e}"])
+        if profile is not None:
+            profile.count("ast_nodes", count_ast_nodes(ast))
+
+        with profile_stage(profile, "semantic"):
+            success, semantic_errors, symbol_table = self.semantic_analyzer.analyze(ast)
+        if not success:
+            source_lines = LineTable(source)
+            raise CompilationError(
+                "semantic",
+                "\nCompilation failed due to semantic errors!",
+                [
+                    format_error(error, error.line, error.column, source_lines)
+                    for error in semantic_errors
+                ],
+            )
+
+        return ast, symbol_table
+
+    def compile(self, source: Source, profile: Optional[CompileProfile] = None) -> List[str]:
+        """
+        Compile a source program to a list of VM instructions.
+        If profile is given, per-stage timings and counts are recorded in it.
+        """
+        self.from_cache = False
+        if profile is not None:
+            profile.start()
+        try:
+            if self.cache is None:
+                return self._compile(source, profile)
+
+            with profile_stage(profile, "cache_lookup"):
+                key = self.cache.key(source, self.options)
+                code = self.cache.get(key)
+            if code is not None:
+                self.from_cache = True
+                if profile is not None:
+                    profile.count("vm_instructions", len(code))
+                return code
+
+            code = self._compile(source, profile)
+            self.cache.put(key, code)
+            return code
+        finally:
+            if profile is not None:
+                profile.stop()
+
+    def compile_to(
+        self,
+        source: Source,
+        path: str,
+        profile: Optional[CompileProfile] = None,
+        per_procedure: bool = False,
+        jobs: Optional[int] = None,
+        source_map: Optional[str] = None,
+    ) -> int:
+        """
+        Compile a source program straight into the file at path and return
+        the number of instructions written. Unlike compile(), the program
+        is never held in memory as a whole: code is emitted once to a
+        temporary file and resolved line by line as it is copied to path
+        (see VMCodeGenerator.stream), so peak memory doesn't grow with the
+        size of the output beyond the IR and the label table.
+        With per_procedure, not even the IR is, and procedures can be lowered
+        in jobs processes: see _write_per_procedure.
+
+        With source_map, a SourceMap of the code is written to that path.
+        It needs the IR of the whole program with its source positions, so
+        the program is compiled afresh, without the compile cache or cached
+        procedure IR, and it can't be combined with per_procedure.
+        """
+        if source_map is not None and per_procedure:
+            raise ValueError("source maps are not available in per-procedure mode")
+        self.from_cache = False
+        if profile is not None:
+            profile.start()
+        try:
+            key = None
+            if self.cache is not None and source_map is None:
+                with profile_stage(profile, "cache_lookup"):
+                    key = self.cache.key(source, self.options)
+                    count = self.cache.get_file(key, path)
+                if count is not None:
+                    self.from_cache = True
+                    if profile is not None:
+                        profile.count("vm_instructions", count)
+                    return count
+
+            if per_procedure:
+                count = self._write_per_procedure(source, path, profile, jobs)
+            else:
+                code_gen, ir = self._lower(source, profile, fresh=source_map is not None)
+                origins = [] if source_map is not None else None
+                with profile_stage(profile, "write"):
+                    count = write_code(path, code_gen.stream(ir, origins))
+                if source_map is not None:
+                    with profile_stage(profile, "source_map"):
+                        SourceMap.build(ir, origins).write(source_map)
+            if profile is not None:
+                profile.count("vm_instructions", count)
+
+            if key is not None:
+                self.cache.put_file(key, path)
+            return count
+        finally:
+            if profile is not None:
+                profile.stop()
+
+    def _write_per_procedure(
+        self,
+        source: Source,
+        path: str,
+        profile: Optional[CompileProfile],
+        jobs: Optional[int] = None,
+    ) -> int:
+        """
+        Bounded-memory compilation. After the (whole-program) front end, each
+        procedure in turn is lowered to IR, turned into VM code and written
+        to a temporary object file, after which its AST and IR are dropped.
+        Addresses and jump targets stay symbolic in the object file; once
+        all variables are known, the linker resolves them while copying it
+        to path. What is kept throughout is the variables, procedure
+        signatures and the label table, not the code.
+
+        With jobs > 1, procedures are lowered in that many worker processes
+        (see lowering.py), each from label and temp 0; their relocatable
+        code is moved into place as it is appended to the object file, so
+        the output is the same as when lowering serially.
+        """
+        ast, symbol_table = self.analyze(source, profile)
+        tac_gen = IRGenerator(symbol_table)
+        relocations = RelocatingMemoryMap()
+        code_gen = VMCodeGenerator(
+            relocations, tac_gen.variables, tac_gen.proc_info,
+            costly_ops=symbol_table.costly_operations,
+        )
+
+        ir_count = 0
+        with tempfile.TemporaryFile("w+", buffering=WRITE_BUFFER) as objects:
+            writer = ObjectWriter(objects)
+            pending = []  # lowered procedures spliced but not yet written
+
+            def lowered(results):
+                for fragment, obj in results:
+                    # The counters before the splice are where obj belongs
+                    pending.append((obj, tac_gen.label_manager.counter, tac_gen.temp_counter))
+                    yield fragment
+
+            with profile_stage(profile, "codegen"):
+                fragments = None
+                if jobs is not None and jobs > 1 and ast.procedures:
+                    fragments = lowered(lower_in_pool(ast.procedures, symbol_table, jobs))
+                for chunk in tac_gen.iter_generate(ast, release=True, fragments=fragments):
+                    # A spliced procedure's IR stayed in its worker
+                    ir_count += len(chunk)
+                    for instruction in chunk:
+                        writer.write(code_gen.compile_ir(instruction))
+                    while pending:
+                        obj, label_base, temp_base = pending.pop()
+                        ir_count += obj.ir_instructions
+                        writer.append(obj, relocations, label_base, temp_base, tac_gen.proc_info)
+                writer.write([HALT()])
+            del ast, fragments
+
+            with profile_stage(profile, "memory_map"):
+                memory_map = MemoryMap(tac_gen.variables)
+                code_gen.memory_map = memory_map
+                prologue = list(code_gen.prologue())
+
+            with profile_stage(profile, "link"):
+                objects.seek(0)
+                count = write_code(
+                    path, link(prologue, objects, writer.labels, relocations.names, memory_map)
+                )
+
+        if profile is not None:
+            profile.count("ir_instructions", ir_count)
+            profile.count("variables", len(tac_gen.variables))
+            profile.count("labels", tac_gen.label_manager.counter)
+        return count
+
+    def _lower(
+        self, source: Source, profile: Optional[CompileProfile], fresh: bool = False
+    ) -> Tuple[VMCodeGenerator, List[IRInstruction]]:
+        """
+        Front end, IR and memory layout: everything before code emission.
+        With fresh, no procedure IR is taken from the fragment cache: cached
+        IR carries the source positions of the compile that generated it.
+        """
+        ast, symbol_table = self.analyze(source, profile)
+
+        with profile_stage(profile, "ir"):
+            fragment_cache = None if fresh else self.fragment_cache
+            tac_gen = IRGenerator(symbol_table, fragment_cache=fragment_cache)
+            ir, vars, proc_info = tac_gen.generate(ast)
+
+        with profile_stage(profile, "memory_map"):
+            mem_manager = MemoryMap(vars)
+            code_gen = VMCodeGenerator(
+                mem_manager, vars, proc_info, costly_ops=symbol_table.costly_operations
+            )
+
+        if profile is not None:
+            profile.count("ir_instructions", len(ir))
+            profile.count("variables", len(vars))
+            profile.count("labels", tac_gen.label_manager.counter)
+        return code_gen, ir
+
+    def _compile(self, source: Source, profile: Optional[CompileProfile]) -> List[str]:
+        code_gen, ir = self._lower(source, profile)
+
+        with profile_stage(profile, "codegen"):
+            labelled_code = code_gen.emit(ir)
+
+        with profile_stage(profile, "correct_labels"):
+            code = correct_labels(labelled_code)
+
+        if profile is not None:
+            profile.count("vm_instructions", len(code))
+        return code
+
+
+# One warm pipeline per process, shared by batch and server pool workers
+_process_pipeline: Optional[CompilerPipeline] = None
+
+
+def worker_pipeline(
+    cache_dir: Optional[str] = None, reuse_procedure_ir: bool = False
+) -> CompilerPipeline:
+    """
+    Get this process's pipeline, creating it on first use (usable as a pool
+    initializer). cache_dir and reuse_procedure_ir (keep procedure IR
+    between compiles) only take effect when the pipeline is created.
+    """
+    global _process_pipeline
+    if _process_pipeline is None:
+        cache = CompileCache(cache_dir) if cache_dir else None
+        fragment_cache = ProcedureIRCache() if reuse_procedure_ir else None
+        _process_pipeline = CompilerPipeline(cache=cache, fragment_cache=fragment_cache)
+    return _process_pipeline
+
+
+def compile_source(source: Source, semantic_only: bool = False) -> Dict:
+    """
+    Compile with the process pipeline, reporting failures instead of raising.
+    Returns {"status": ..., "code": [...], "errors": [...], "cached": bool}
+    where status is 'ok', '<stage>_error' or 'internal_error'.
+    """
+    result = {"status": "ok", "code": [], "errors": [], "cached": False}
+    pipeline = worker_pipeline()
+    try:
+        if semantic_only:
+            pipeline.analyze(source)
+        else:
+            result["code"] = pipeline.compile(source)
+            result["cached"] = pipeline.from_cache
+    except CompilationError as e:
+        result["status"] = f"{e.stage}_error"
+        result["errors"] = [message.strip() for message in e.messages]
+    except Exception as e:
+        result["status"] = "internal_error"
+        result["errors"] = [f"{type(e).__name__}: {e}"]
+    return result
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from ..intermediate_rep.IR_ops import Variable
 
 @dataclass
@@ -10,6 +10,12 @@ class MemoryCell:
     array_size: Optional[int] = None
 
 class MemoryMap:
+    """
+    Addresses of a program's variables, indexed by variable id (see
+    register_variable): looking an operand up is a list access, and
+    only arrays keep a MemoryCell.
+    """
+
     def __init__(self, variables: Dict[str, 'Variable']):
         """Initialize memory map and assign addresses for all variables"""
         # Initialize address counters
@@ -17,7 +23,9 @@ class MemoryMap:
         self.next_temp_addr = 2**30    # Start temps from high address
         
         # Memory mappings
-        self.memory: Dict[str, MemoryCell] = {}
+        self.variables = variables
+        self.addresses: List[Optional[int]] = [None] * len(variables)  # id -> address
+        self.arrays: Dict[int, MemoryCell] = {}  # id -> array cell
         self.const_map: Dict[int, int] = {}  # value -> address mapping
         
         # Allocate all variables
@@ -52,20 +60,19 @@ class MemoryMap:
                 
                 
                     
-                self.memory[var_name] = MemoryCell(
+                self.arrays[var.id] = MemoryCell(
                     address=self.next_regular_addr +1,
                     is_array=True,
                     array_start_address=zero_adress,
                     array_size=var.array_size
                 )
+                self.addresses[var.id] = self.next_regular_addr + 1
 
                 self.next_regular_addr += var.array_size + 1
                 
                 
             else:
-                self.memory[var_name] = MemoryCell(
-                    address=self.next_regular_addr
-                )
+                self.addresses[var.id] = self.next_regular_addr
                 self.next_regular_addr += 1
                 
     def _allocate_constants(self, variables: Dict[str, 'Variable']):
@@ -81,14 +88,10 @@ class MemoryMap:
             value = var.const_value
             if value in self.const_map:
                 # Reuse existing address for this constant
-                self.memory[var_name] = MemoryCell(
-                    address=self.const_map[value]
-                )
+                self.addresses[var.id] = self.const_map[value]
             else:
                 # Allocate new address for this constant
-                self.memory[var_name] = MemoryCell(
-                    address=self.next_regular_addr
-                )
+                self.addresses[var.id] = self.next_regular_addr
                 self.const_map[value] = self.next_regular_addr
                 self.next_regular_addr += 1
                 
@@ -101,43 +104,52 @@ class MemoryMap:
             if var.is_array:
                 # Allocate space for temp array
                 self.next_temp_addr -= var.array_size
-                self.memory[var_name] = MemoryCell(
+                self.arrays[var.id] = MemoryCell(
                     address=self.next_temp_addr,
                     is_array=True,
-                    array_start=var.array_start,
+                    array_start_address=var.array_start,
                     array_size=var.array_size
                 )
+                self.addresses[var.id] = self.next_temp_addr
             else:
                 self.next_temp_addr -= 1
-                self.memory[var_name] = MemoryCell(
-                    address=self.next_temp_addr
-                )
+                self.addresses[var.id] = self.next_temp_addr
             
             
-    def get_address(self, var_name: str) -> Optional[int]:
+    def get_address(self, var: 'Variable') -> Optional[int]:
         """Get memory address for a variable"""
-        # print(f"Getting address for {var_name}")
+        address = self.addresses[var.id] if var.id >= 0 else None
+        if address is None:
+            raise RuntimeError(f'No adress for variable {var.name} found')
+        return address
 
-        if var_name in self.memory:
-            # print(f"Returning {self.memory[var_name].address}")
-            return self.memory[var_name].address
+    def address_of(self, var_name: str) -> int:
+        """get_address() of the variable registered under var_name"""
+        if var_name not in self.variables:
+            raise RuntimeError(f'No adress for variable {var_name} found')
+        return self.get_address(self.variables[var_name])
         
-        raise RuntimeError(f'No adress for variable {var_name} found')
-        return None
-        
-    def get_array_info(self, array_name: str) -> Optional[Tuple[int, int, int]]:
+    def get_array_info(self, var: 'Variable') -> Optional[Tuple[int, int, int]]:
         """Get array (address, start_index, size)"""
-        if array_name in self.memory:
-            cell = self.memory[array_name]
-            if cell.is_array:
-                return (cell.address, cell.array_start_address, cell.array_size)
+        cell = self.arrays.get(var.id)
+        if cell is not None:
+            return (cell.address, cell.array_start_address, cell.array_size)
         return None
         
-    def is_array(self, var_name: str) -> bool:
+    def is_array(self, var: 'Variable') -> bool:
         """Check if variable is an array"""
-        if var_name in self.memory:
-            return self.memory[var_name].is_array
-        return False
+        return var.id in self.arrays
+
+    @property
+    def memory(self) -> Dict[str, MemoryCell]:
+        """Cells by variable name, for the debug printouts"""
+        return dict(self._cells())
+
+    def _cells(self) -> Iterator[Tuple[str, MemoryCell]]:
+        for name, var in self.variables.items():
+            address = self.addresses[var.id]
+            if address is not None:
+                yield name, self.arrays.get(var.id) or MemoryCell(address=address)
         
     def print_map(self):
         """Print memory map for debugging"""
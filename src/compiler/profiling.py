@@ -0,0 +1,129 @@
+# src/compiler/profiling.py
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field, fields, is_dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass
+class StageProfile:
+    name: str
+    wall_time: float = 0.0  # seconds
+    cpu_time: float = 0.0  # seconds of process CPU time
+    peak_memory: int = 0  # bytes allocated above the stage's starting point, at peak
+
+
+@dataclass
+class CompileProfile:
+    """
+    Per-stage timings, peak memory and size counts of one compilation.
+    Pass an instance to CompilerPipeline.compile() to fill it in:
+
+        profile = CompileProfile()
+        pipeline.compile(source, profile=profile)
+        print(profile.format_table())
+
+    With trace_memory, tracemalloc runs for the whole compilation (started
+    and stopped here unless it was already running), which also makes
+    every stage noticeably slower; turn it off for timing-only runs.
+    """
+
+    trace_memory: bool = True
+    stages: List[StageProfile] = field(default_factory=list)
+    counts: Dict[str, int] = field(default_factory=dict)
+    _own_tracing: bool = field(default=False, repr=False)
+
+    def start(self) -> None:
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracing = True
+
+    def stop(self) -> None:
+        if self._own_tracing:
+            tracemalloc.stop()
+            self._own_tracing = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Measure the enclosed block as one stage."""
+        stage = StageProfile(name)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base_memory = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield stage
+        finally:
+            stage.wall_time = time.perf_counter() - wall_start
+            stage.cpu_time = time.process_time() - cpu_start
+            if tracing:
+                stage.peak_memory = max(0, tracemalloc.get_traced_memory()[1] - base_memory)
+            self.stages.append(stage)
+
+    def count(self, name: str, value: int) -> None:
+        self.counts[name] = value
+
+    @property
+    def total_wall_time(self) -> float:
+        return sum(stage.wall_time for stage in self.stages)
+
+    @property
+    def total_cpu_time(self) -> float:
+        return sum(stage.cpu_time for stage in self.stages)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_memory": self.trace_memory,
+            "stages": [asdict(stage) for stage in self.stages],
+            "total": {
+                "wall_time": self.total_wall_time,
+                "cpu_time": self.total_cpu_time,
+                "peak_memory": max((stage.peak_memory for stage in self.stages), default=0),
+            },
+            "counts": dict(self.counts),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def format_table(self) -> str:
+        lines = [f"{'stage':<16}{'wall ms':>12}{'cpu ms':>12}{'peak KiB':>12}"]
+        for stage in self.stages:
+            peak = f"{stage.peak_memory / 1024:.1f}" if self.trace_memory else "-"
+            lines.append(
+                f"{stage.name:<16}{stage.wall_time * 1000:>12.2f}"
+                f"{stage.cpu_time * 1000:>12.2f}{peak:>12}"
+            )
+        lines.append(
+            f"{'total':<16}{self.total_wall_time * 1000:>12.2f}{self.total_cpu_time * 1000:>12.2f}"
+        )
+        if self.counts:
+            lines.append("")
+            for name, value in self.counts.items():
+                lines.append(f"{name:<16}{value:>12}")
+        return "\n".join(lines)
+
+
+def profile_stage(profile: Optional[CompileProfile], name: str):
+    """profile.stage(name), or a no-op when not profiling."""
+    return profile.stage(name) if profile is not None else nullcontext()
+
+
+def count_ast_nodes(root) -> int:
+    """Number of AST nodes below (and including) root."""
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif is_dataclass(node):
+            count += 1
+            for f in fields(node):
+                if f.name != "location":
+                    stack.append(getattr(node, f.name))
+    return count
@@ -56,9 +56,10 @@ class SemanticAnalyzer:
         return len(self.errors) == 0, self.errors, self.symbol_table
 
     def prune_ast(self, program: Program) -> Program:
-        for proc in program.procedures:
-            if not self.symbol_table.is_procedure(proc.name):
-                program.procedures.remove(proc)
+        program.procedures = [
+            proc for proc in program.procedures
+            if self.symbol_table.is_procedure(proc.name)
+        ]
 
     def _check_main_program(
         self, declarations: List[Declaration], commands: List[Command]
@@ -258,11 +259,8 @@ class SemanticAnalyzer:
 
         local_vars = set()
         if self.current_procedure:
-            for name, symbol in self.symbol_table.symbols.items():
-                if (
-                    symbol.procedure_name == self.current_procedure
-                    and symbol.symbol_type == "local"
-                ):
+            for symbol in self.symbol_table.current_scope.symbols.values():
+                if symbol.symbol_type == "local":
                     local_vars.add(symbol.name)
 
         if cmd.name == self.current_procedure:
@@ -0,0 +1,231 @@
+# src/compiler/server.py
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import stat
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional
+
+from .pipeline import compile_source, worker_pipeline, write_code
+from .source import read_source
+
+DEFAULT_TIMEOUT = 30.0  # seconds per request
+MAX_REQUEST_BYTES = 64 * 2**20  # one request line, source included
+
+
+def _init_worker(cache_dir: Optional[str]) -> None:
+    # Ctrl-C is meant for the server, which shuts the pool down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Clients resend the programs they edit, so procedure IR is worth keeping
+    worker_pipeline(cache_dir, reuse_procedure_ir=True)
+
+
+def _serve_request(request: Dict) -> Dict:
+    """Worker side: load the source, compile it and optionally write the output."""
+    semantic_only = bool(request.get("semantic_only"))
+    try:
+        source = request.get("source")
+        if source is None:
+            source = read_source(request["file"])
+
+        result = compile_source(source, semantic_only=semantic_only)
+
+        output = request.get("output")
+        if output and result["status"] == "ok" and not semantic_only:
+            write_code(output, result["code"])
+            result["code"] = []
+            result["output"] = output
+    except OSError as e:
+        result = {"status": "io_error", "code": [], "errors": [str(e)]}
+    return result
+
+
+class _StdinReader:
+    """Line reader over stdin that works for pipes, terminals and regular files."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+
+    async def readline(self) -> bytes:
+        loop = asyncio.get_running_loop()
+        line = await loop.run_in_executor(None, sys.stdin.buffer.readline, self.limit + 1)
+        if len(line) > self.limit:
+            raise ValueError("Request line exceeds the size limit")
+        return line
+
+
+class CompileServer:
+    """
+    Resident compiler service speaking JSON lines. Requests:
+        {"id": 1, "source": "PROGRAM IS ... END", "timeout": 5}
+        {"id": 2, "file": "prog.imp", "output": "prog.mr"}
+        {"id": 3, "source": "...", "semantic_only": true}
+    Every request gets exactly one response line, in completion order:
+        {"id": 1, "status": "ok", "code": [...], "errors": [], "cached": false,
+         "elapsed": 0.01}
+    status is 'ok', '<stage>_error', 'internal_error', 'io_error',
+    'timeout' or 'bad_request'.
+
+    Requests are compiled concurrently on a process pool, each worker holding
+    one warm CompilerPipeline. At most max_pending requests are in flight;
+    when they are all taken the server stops reading input, so clients feel
+    backpressure instead of growing an unbounded queue. A timed out request
+    is answered immediately, but keeps its slot until its worker is done.
+    """
+
+    def __init__(
+        self,
+        jobs: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        cache_dir: Optional[str] = None,
+    ):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.jobs
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+
+    def _start(self) -> None:
+        if self.executor is None:
+            # Workers are started lazily, possibly after clients have
+            # connected; 'spawn' keeps them from inheriting client sockets
+            # (a forked copy would hold connections open after we close them)
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.jobs,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.cache_dir,),
+            )
+            self.slots = asyncio.Semaphore(self.max_pending)
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def handle(self, line: bytes) -> Dict:
+        """Compile one request line. The caller must hold a slot; it is released here."""
+        start = time.perf_counter()
+        request: Dict = {}
+        slot_handed_off = False
+        try:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be a JSON object")
+                if "source" not in request and "file" not in request:
+                    raise ValueError("Request needs a 'source' or a 'file'")
+                timeout = float(request.get("timeout", self.timeout))
+            except (ValueError, TypeError) as e:
+                response = {"status": "bad_request", "errors": [str(e)]}
+                if not isinstance(request, dict):
+                    request = {}
+            else:
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(self.executor, _serve_request, request)
+                # From here on the worker finishing is what frees the slot
+                future.add_done_callback(lambda _: self.slots.release())
+                slot_handed_off = True
+
+                done, _ = await asyncio.wait({future}, timeout=timeout)
+                if future in done:
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        response = {
+                            "status": "internal_error",
+                            "errors": [f"{type(e).__name__}: {e}"],
+                        }
+                else:
+                    response = {
+                        "status": "timeout",
+                        "errors": [f"Compilation did not finish within {timeout}s"],
+                    }
+        finally:
+            if not slot_handed_off:
+                self.slots.release()
+
+        response.setdefault("code", [])
+        response["id"] = request.get("id")
+        response["elapsed"] = time.perf_counter() - start
+        return response
+
+    async def serve_stream(
+        self, reader, write: Callable[[Dict], Awaitable[None]]
+    ) -> None:
+        """Serve requests from one line-oriented reader until end of input."""
+        self._start()
+        pending = set()
+
+        async def respond(line: bytes) -> None:
+            await write(await self.handle(line))
+
+        while True:
+            await self.slots.acquire()
+            try:
+                line = await reader.readline()
+            except ValueError as e:
+                self.slots.release()
+                await write({"id": None, "status": "bad_request", "code": [], "errors": [str(e)]})
+                break
+            if not line.strip():
+                self.slots.release()
+                if not line:
+                    break
+                continue
+
+            task = asyncio.create_task(respond(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def serve_stdio(self) -> None:
+        """Read requests from stdin and write responses to stdout."""
+
+        async def write(response: Dict) -> None:
+            sys.stdout.write(json.dumps(response) + "\n")
+            sys.stdout.flush()
+
+        try:
+            await self.serve_stream(_StdinReader(MAX_REQUEST_BYTES), write)
+        finally:
+            self.close()
+
+    async def serve_unix(self, path: str) -> None:
+        """Accept any number of client connections on a Unix socket."""
+        self._start()
+
+        async def on_connection(reader, writer) -> None:
+            async def write(response: Dict) -> None:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+            try:
+                await self.serve_stream(reader, write)
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+
+        # Remove a stale socket left behind by a previous server
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+
+        server = await asyncio.start_unix_server(
+            on_connection, path=path, limit=MAX_REQUEST_BYTES
+        )
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+            if os.path.exists(path):
+                os.unlink(path)
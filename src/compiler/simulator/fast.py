@@ -0,0 +1,367 @@
+# src/compiler/simulator/fast.py
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+
+from .machine import (
+    COSTS,
+    InputSource,
+    Instruction,
+    Machine,
+    RunResult,
+    VMError,
+    _reader,
+)
+
+RELATIVE_JUMPS = {"JUMP", "JPOS", "JZERO", "JNEG"}
+# Conditional jumps and the test they make on p0
+CONDITIONS = {"JPOS": "a > 0", "JZERO": "not a", "JNEG": "a < 0"}
+
+
+def block_leaders(program: List[Instruction]) -> Set[int]:
+    """
+    Lines a basic block starts at: the first one, every jump target and
+    every line after a jump, RTRN or HALT, and the line past the end, which
+    code without a final HALT runs into. RTRN can also go to lines nobody
+    jumps to; blocks starting there are made when first needed.
+    """
+    leaders = {0, len(program)}
+    for line, (mnemonic, a) in enumerate(program):
+        if mnemonic in RELATIVE_JUMPS:
+            leaders.add(line + a)
+            leaders.add(line + 1)
+        elif mnemonic == "RTRN" or mnemonic == "HALT":
+            leaders.add(line + 1)
+    return leaders
+
+
+# What an instruction does with p0 before anything else: None if it
+# leaves it alone, otherwise whether it reads it (False: overwrites it).
+# LOADI counts as a read: its pointer may be 0.
+_OVERWRITES = {"LOAD", "SET"}
+_LEAVES = {"GET", "PUT", "JUMP"}
+
+
+def reads_acc(program: List[Instruction], line: int) -> bool:
+    """
+    Whether code entered at line may read p0 before overwriting it. A
+    block going on to such code only has to write p0 back to M[0] then.
+    """
+    seen = set()
+    while 0 <= line < len(program) and line not in seen:
+        seen.add(line)
+        mnemonic, a = program[line]
+        if mnemonic in _OVERWRITES and a != 0:
+            return False
+        if mnemonic == "GET" and a == 0:
+            return False
+        if mnemonic in _LEAVES and a != 0:
+            line = line + a if mnemonic == "JUMP" else line + 1
+        elif mnemonic == "LOAD":  # LOAD 0
+            line += 1
+        else:
+            return True
+    return True
+
+
+def _block_name(line: int) -> str:
+    return f"B{line}" if line >= 0 else f"B_{-line}"
+
+
+class _BlockSource:
+    """
+    Python source of one block. p0 lives in the local a while the block
+    runs: it's read from M[0] on first use and written back before the
+    block hands over to a block that may read it. A value computed from
+    cells only (LOAD x; SUB y) is kept as a pending expression until
+    something needs it, and a LOAD of the cell p0 was just stored to or
+    loaded from is dropped: neither changes what the program computes.
+    """
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.names: Set[str] = {"M", "h"}  # globals the block uses
+        self.expr: Optional[str] = None  # p0, not assigned to a yet
+        self.loaded = False  # a holds p0
+        self.dirty = False  # M[0] is behind
+        self.mirror: Optional[int] = None  # cell known to hold p0
+
+    def emit(self, text: str) -> None:
+        self.acc()
+        self.lines.append(text)
+
+    def acc(self) -> str:
+        """a, holding p0."""
+        if self.expr is not None:
+            self.lines.append(f"a = {self.expr}")
+            self.expr = None
+            self.loaded = True
+        elif not self.loaded:
+            self.lines.append("a = M[0]")
+            self.loaded = True
+        return "a"
+
+    def operand(self) -> str:
+        """p0 as an operand of a larger expression."""
+        if self.expr is None:
+            return self.acc()
+        return f"({self.expr})" if " " in self.expr else self.expr
+
+    def assign(self, text: str) -> None:
+        """a = text, right now: for values that must be computed exactly once."""
+        self.expr = None
+        self.lines.append(f"a = {text}")
+        self.loaded = True
+        self.dirty = True
+        self.mirror = None
+
+    def set_acc(self, expr: str) -> None:
+        self.expr = expr
+        self.dirty = True
+        self.mirror = None
+
+    def cell(self, address: int) -> str:
+        """Expression for cell address; p0 is a."""
+        return self.operand() if address == 0 else f"M[{address}]"
+
+    def pointer(self, address: int) -> None:
+        """p = the address held in cell address, for the indirect ops."""
+        self.acc()  # the pointer may be 0, which names p0 itself
+        self.emit(f"p = {self.cell(address)}")
+
+    def flush(self) -> None:
+        if self.dirty:
+            self.emit("M[0] = a")
+            self.dirty = False
+
+
+class FastMachine:
+    """
+    Runs VM code by compiling its basic blocks into Python functions, with
+    addresses and constants baked in and p0 kept in a local. Each block
+    returns the next block's function (None on HALT), so running the
+    program is calling functions in a loop. Blocks are compiled on first
+    entry: until then their name is bound to a stub.
+
+    Cost and step counts are those of the reference Machine: each block
+    counts its entries, and its cost is a constant sum. With a step
+    limit, the block that would cross it is run on a reference Machine
+    instead, one instruction at a time, so the limit is hit exactly where
+    Machine hits it.
+    """
+
+    def __init__(self, program: List[Instruction], inputs: InputSource = ()):
+        self.program = program
+        self.read = _reader(inputs)
+        self.memory: Dict[int, int] = defaultdict(int)
+        self.output: List[int] = []
+        self.leaders = block_leaders(program)
+        self.hits: List[int] = []  # entries per compiled block
+        self.block_costs: List[int] = []
+        self.block_steps: List[int] = []
+        self.block_lines: List[int] = []
+        self._reads_acc: Dict[int, bool] = {}
+        # Globals of the compiled blocks, which name each other B<line>.
+        # Every leader starts out as a stub compiling its block.
+        self.namespace = dict(
+            M=self.memory,
+            read=self.read,
+            out=self.output.append,
+            h=self.hits,
+            block_at=self.block_at,
+        )
+        for line in self.leaders:
+            self.namespace[_block_name(line)] = self._stub(line)
+
+    def run(self, step_limit: Optional[int] = None) -> RunResult:
+        block = self.block_at(0)
+        if step_limit is None:
+            while block is not None:
+                block = block()
+        else:
+            steps = self.block_steps
+            remaining = step_limit
+            while block is not None:
+                if block.index < 0:
+                    block = self.compiled(block.line)
+                n = steps[block.index]
+                if n > remaining:
+                    return self._finish_on_reference(block.line, step_limit)
+                remaining -= n
+                block = block()
+        return RunResult(self.output, self.cost, self.steps, self.memory)
+
+    @property
+    def cost(self) -> int:
+        return sum(h * c for h, c in zip(self.hits, self.block_costs))
+
+    @property
+    def steps(self) -> int:
+        return sum(h * s for h, s in zip(self.hits, self.block_steps))
+
+    def _finish_on_reference(self, line: int, step_limit: int) -> RunResult:
+        machine = Machine(self.program, self.read)
+        machine.memory = self.memory
+        machine.output = self.output
+        machine.k = line
+        machine.cost = self.cost
+        machine.steps = self.steps
+        return machine.run(step_limit)
+
+    def block_at(self, line: int) -> Callable:
+        """The block starting at line, for RTRN."""
+        name = _block_name(line)
+        block = self.namespace.get(name)
+        if block is None:
+            block = self.namespace[name] = self._stub(line)
+        return block
+
+    def _stub(self, line: int) -> Callable:
+        """Stand-in for a block not compiled yet: compiles it, then runs it."""
+        name = _block_name(line)
+
+        def stub():
+            return self.compiled(line)()
+
+        stub.index = -1
+        stub.line = line
+        return stub
+
+    def compiled(self, line: int) -> Callable:
+        """The compiled block starting at line, in place of its stub from now on."""
+        block = self.namespace[_block_name(line)] = self.compile_block(line)
+        return block
+
+    def compile_block(self, line: int) -> Callable:
+        """Function running the block that starts at line."""
+        program = self.program
+        if not 0 <= line < len(program):
+
+            def outside():
+                raise VMError(f"jump to line {line}, outside the program")
+
+            # One step, so that a step limit reached here is reported first
+            outside.index = self._new_block(0, 1, line)
+            outside.line = line
+            return outside
+
+        index = self._new_block(0, 0, line)
+        source = _BlockSource()
+        source.lines.append(f"h[{index}] += 1")
+        cost = steps = 0
+        k = line
+        while True:
+            mnemonic, a = program[k]
+            cost += COSTS[mnemonic]
+            steps += 1
+            if self._compile_instruction(source, k, mnemonic, a):
+                break
+            k += 1
+            if k in self.leaders:
+                self._flush_for(source, k)
+                source.emit(f"return {_block_name(k)}")
+                break
+
+        name = _block_name(line)
+        text = "\n    ".join(source.lines)
+        # Globals become parameter defaults, which are read as fast as locals
+        params = ", ".join(f"{global_name}={global_name}" for global_name in sorted(source.names))
+        code = f"def {name}({params}):\n    {text}\n"
+        exec(code, self.namespace)
+        block = self.namespace.pop(name)
+        block.index = index
+        block.line = line
+        self.block_costs[index] = cost
+        self.block_steps[index] = steps
+        return block
+
+    def _flush_for(self, source: _BlockSource, *lines: int) -> None:
+        """Write p0 back if code at any of lines may read it."""
+        for line in lines:
+            reads = self._reads_acc.get(line)
+            if reads is None:
+                reads = self._reads_acc[line] = reads_acc(self.program, line)
+            if reads:
+                source.flush()
+                return
+
+    def _new_block(self, cost: int, steps: int, line: int) -> int:
+        self.hits.append(0)
+        self.block_costs.append(cost)
+        self.block_steps.append(steps)
+        self.block_lines.append(line)
+        return len(self.hits) - 1
+
+    def _compile_instruction(self, source: _BlockSource, k: int, mnemonic: str, a: int) -> bool:
+        """Emit one instruction; True if it ends the block."""
+        if mnemonic == "GET":
+            source.names.add("read")
+            if a == 0:
+                source.assign("read()")
+            else:
+                source.emit(f"M[{a}] = read()")
+                if a == source.mirror:
+                    source.mirror = None
+        elif mnemonic == "PUT":
+            source.names.add("out")
+            # p0 first: a pending expression may use a, which emit() reassigns
+            source.acc()
+            source.emit(f"out({source.cell(a)})")
+        elif mnemonic == "LOAD":
+            if a != 0 and a != source.mirror:
+                source.set_acc(f"M[{a}]")
+                source.mirror = a
+        elif mnemonic == "STORE":
+            if a != 0:
+                source.emit(f"M[{a}] = {source.acc()}")
+                source.mirror = a
+        elif mnemonic == "LOADI":
+            source.pointer(a)
+            source.emit("if p:")
+            source.emit("    a = M[p]")
+            source.dirty = True
+            source.mirror = None
+        elif mnemonic == "STOREI":
+            # STOREI through a pointer to 0 stores p0 into itself
+            source.pointer(a)
+            source.emit("if p:")
+            source.emit("    M[p] = a")
+            source.mirror = None
+        elif mnemonic in ("ADD", "SUB"):
+            operator = "+" if mnemonic == "ADD" else "-"
+            source.set_acc(f"{source.operand()} {operator} {source.cell(a)}")
+        elif mnemonic in ("ADDI", "SUBI"):
+            operator = "+" if mnemonic == "ADDI" else "-"
+            source.pointer(a)
+            source.set_acc(f"a {operator} (M[p] if p else a)")
+        elif mnemonic == "SET":
+            source.set_acc(str(a))
+        elif mnemonic == "HALF":
+            source.set_acc(f"{source.operand()} >> 1")
+        elif mnemonic == "JUMP":
+            self._flush_for(source, k + a)
+            source.emit(f"return {_block_name(k + a)}")
+            return True
+        elif mnemonic in CONDITIONS:
+            source.acc()
+            self._flush_for(source, k + a, k + 1)
+            source.emit(f"if {CONDITIONS[mnemonic]}:")
+            source.emit(f"    return {_block_name(k + a)}")
+            source.emit(f"return {_block_name(k + 1)}")
+            return True
+        elif mnemonic == "RTRN":
+            source.names.add("block_at")
+            source.flush()
+            source.emit(f"return block_at({source.cell(a)})")
+            return True
+        elif mnemonic == "HALT":
+            source.flush()
+            source.emit("return None")
+            return True
+        return False
+
+
+def run_fast(
+    program: List[Instruction], inputs: InputSource = (), step_limit: Optional[int] = None
+) -> RunResult:
+    """Run a program on the block-compiling FastMachine."""
+    return FastMachine(program, inputs).run(step_limit)
@@ -0,0 +1,193 @@
+# src/compiler/simulator/machine.py
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Cycles per instruction, as charged by the course VM
+COSTS: Dict[str, int] = {
+    "GET": 100,
+    "PUT": 100,
+    "LOAD": 10,
+    "STORE": 10,
+    "LOADI": 20,
+    "STOREI": 20,
+    "ADD": 10,
+    "SUB": 10,
+    "ADDI": 20,
+    "SUBI": 20,
+    "SET": 50,
+    "HALF": 5,
+    "JUMP": 1,
+    "JPOS": 1,
+    "JZERO": 1,
+    "JNEG": 1,
+    "RTRN": 10,
+    "HALT": 0,
+}
+
+NO_OPERAND = {"HALF", "HALT"}
+
+# One instruction: mnemonic and operand (0 when it takes none)
+Instruction = Tuple[str, int]
+
+
+class VMError(RuntimeError):
+    """
+    The program did something the machine can't run, e.g. jumped off its
+    end. line is the 0-based instruction it happened at, when known; in
+    parse errors it is the 1-based line of the file.
+    """
+
+    def __init__(self, message: str, line: Optional[int] = None):
+        super().__init__(message if line is None else f"at {line}: {message}")
+        self.line = line
+
+
+class StepLimitExceeded(VMError):
+    pass
+
+
+class InputExhausted(VMError):
+    pass
+
+
+def parse_program(lines: Iterable[str]) -> List[Instruction]:
+    """
+    Instructions of VM code as written by the compiler (or by hand): one
+    per line, '#' starts a comment, blank lines are skipped.
+    """
+    program = []
+    for number, text in enumerate(lines, 1):
+        words = text.split("#", 1)[0].split()
+        if not words:
+            continue
+        mnemonic = words[0]
+        if mnemonic not in COSTS:
+            raise VMError(f"unknown instruction {mnemonic!r}", number)
+        expected = 1 if mnemonic in NO_OPERAND else 2
+        if len(words) != expected:
+            raise VMError(f"{mnemonic} takes {expected - 1} operand(s)", number)
+        try:
+            operand = int(words[1]) if expected == 2 else 0
+        except ValueError:
+            raise VMError(f"bad operand {words[1]!r}", number) from None
+        program.append((mnemonic, operand))
+    return program
+
+
+def load_program(path: str) -> List[Instruction]:
+    with open(path) as f:
+        return parse_program(f)
+
+
+InputSource = Union[Iterable[int], Callable[[], int]]
+
+
+def _reader(inputs: InputSource) -> Callable[[], int]:
+    """A function returning the next input value, from a script or a callback."""
+    if callable(inputs):
+        return inputs
+    values: Iterator[int] = iter(inputs)
+
+    def read() -> int:
+        try:
+            return int(next(values))
+        except StopIteration:
+            raise InputExhausted("GET with no input left") from None
+
+    return read
+
+
+@dataclass
+class RunResult:
+    output: List[int]
+    cost: int  # cycles, per COSTS
+    steps: int  # instructions executed, HALT included
+    memory: Dict[int, int] = field(repr=False)
+
+
+class Machine:
+    """
+    Reference implementation of the JFTT register machine. Memory cells
+    hold arbitrary integers and read as 0 until written; p0 is the
+    accumulator. Every jump is relative to its own line, except RTRN,
+    which jumps to the line held in its operand cell.
+
+    This is the straightforward fetch-decode-execute loop the other
+    engines are checked against, so it favors being obviously right.
+    """
+
+    def __init__(self, program: List[Instruction], inputs: InputSource = ()):
+        self.program = program
+        self.read = _reader(inputs)
+        self.memory: Dict[int, int] = {}
+        self.output: List[int] = []
+        self.k = 0  # next line
+        self.cost = 0
+        self.steps = 0
+        self.halted = False
+
+    def run(self, step_limit: Optional[int] = None) -> RunResult:
+        """Run until HALT; with step_limit, give up after that many instructions."""
+        while not self.halted:
+            if step_limit is not None and self.steps >= step_limit:
+                raise StepLimitExceeded(f"no HALT after {step_limit} steps", self.k)
+            self.step()
+        return RunResult(self.output, self.cost, self.steps, self.memory)
+
+    def step(self) -> None:
+        """Execute the instruction at line k."""
+        k = self.k
+        if not 0 <= k < len(self.program):
+            raise VMError(f"jump to line {k}, outside the program")
+        mnemonic, a = self.program[k]
+        memory = self.memory
+        self.cost += COSTS[mnemonic]
+        self.steps += 1
+        self.k = k + 1
+
+        if mnemonic == "GET":
+            memory[a] = self.read()
+        elif mnemonic == "PUT":
+            self.output.append(memory.get(a, 0))
+        elif mnemonic == "LOAD":
+            memory[0] = memory.get(a, 0)
+        elif mnemonic == "STORE":
+            memory[a] = memory.get(0, 0)
+        elif mnemonic == "LOADI":
+            memory[0] = memory.get(memory.get(a, 0), 0)
+        elif mnemonic == "STOREI":
+            memory[memory.get(a, 0)] = memory.get(0, 0)
+        elif mnemonic == "ADD":
+            memory[0] = memory.get(0, 0) + memory.get(a, 0)
+        elif mnemonic == "SUB":
+            memory[0] = memory.get(0, 0) - memory.get(a, 0)
+        elif mnemonic == "ADDI":
+            memory[0] = memory.get(0, 0) + memory.get(memory.get(a, 0), 0)
+        elif mnemonic == "SUBI":
+            memory[0] = memory.get(0, 0) - memory.get(memory.get(a, 0), 0)
+        elif mnemonic == "SET":
+            memory[0] = a
+        elif mnemonic == "HALF":
+            memory[0] = memory.get(0, 0) // 2
+        elif mnemonic == "JUMP":
+            self.k = k + a
+        elif mnemonic == "JPOS":
+            if memory.get(0, 0) > 0:
+                self.k = k + a
+        elif mnemonic == "JZERO":
+            if memory.get(0, 0) == 0:
+                self.k = k + a
+        elif mnemonic == "JNEG":
+            if memory.get(0, 0) < 0:
+                self.k = k + a
+        elif mnemonic == "RTRN":
+            self.k = memory.get(a, 0)
+        elif mnemonic == "HALT":
+            self.halted = True
+
+
+def run(
+    program: List[Instruction], inputs: InputSource = (), step_limit: Optional[int] = None
+) -> RunResult:
+    """Run a program on the reference Machine."""
+    return Machine(program, inputs).run(step_limit)
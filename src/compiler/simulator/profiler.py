@@ -0,0 +1,255 @@
+# src/compiler/simulator/profiler.py
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..source_map import SourceMap
+from .fast import FastMachine
+from .machine import COSTS, InputSource, Instruction, StepLimitExceeded
+
+# Procedures active at some point, outermost first: each frame is the
+# procedure and the VM line of the jump that called it (-1 for main)
+Stack = Tuple[Tuple[str, int], ...]
+
+ROOT: Stack = (("main", -1),)
+
+
+@dataclass
+class LineStats:
+    """Cost of the code generated for one source line (0: none, e.g. a runtime routine)."""
+    line: int
+    procedure: str
+    count: int  # executions of its first instruction
+    cycles: int
+
+
+@dataclass
+class ProcedureStats:
+    procedure: str
+    calls: int
+    self_cycles: int  # in its own code
+    total_cycles: int  # with the procedures it called
+
+
+@dataclass
+class LoopStats:
+    kind: str  # WHILE, FOR or REPEAT
+    line: int
+    column: int
+    procedure: str
+    count: int  # times control reached the top of the loop
+    cycles: int  # with the procedures called from it
+
+
+class Profile:
+    """
+    Execution counts of a program's VM lines, per call stack, with the
+    SourceMap to read them in source terms. Call stacks are exact: the
+    language has no recursion, so a jump into another procedure's code is
+    a call, and a jump back into a caller's a return.
+    """
+
+    def __init__(
+        self,
+        program: List[Instruction],
+        source_map: SourceMap,
+        counts: Dict[Stack, Dict[int, int]],
+        calls: Dict[Stack, int],
+        output: List[int],
+    ):
+        self.program = program
+        self.source_map = source_map
+        self.counts = counts  # executions per VM line, per stack
+        self.calls = calls  # times each stack was entered
+        self.output = output
+        self.cycles: Dict[Stack, int] = {
+            stack: sum(n * COSTS[program[line][0]] for line, n in lines.items())
+            for stack, lines in counts.items()
+        }
+
+    @property
+    def cost(self) -> int:
+        return sum(self.cycles.values())
+
+    @property
+    def steps(self) -> int:
+        return sum(n for lines in self.counts.values() for n in lines.values())
+
+    def line_counts(self) -> Dict[int, int]:
+        """Executions per VM line, over all stacks."""
+        total: Dict[int, int] = defaultdict(int)
+        for lines in self.counts.values():
+            for line, n in lines.items():
+                total[line] += n
+        return total
+
+    def source_lines(self) -> List[LineStats]:
+        """Cost per source line and procedure, costliest first."""
+        stats: Dict[Tuple[int, str], LineStats] = {}
+        for line, n in sorted(self.line_counts().items()):
+            origin = self.source_map.origin(line)
+            key = (origin.line, origin.procedure or "main") if origin else (0, "main")
+            entry = stats.get(key)
+            if entry is None:
+                entry = stats[key] = LineStats(key[0], key[1], n, 0)
+            entry.cycles += n * COSTS[self.program[line][0]]
+        return sorted(stats.values(), key=lambda s: -s.cycles)
+
+    def procedures(self) -> List[ProcedureStats]:
+        """Calls and cost per procedure, costliest (with callees) first."""
+        stats: Dict[str, ProcedureStats] = {}
+        for stack, cycles in self.cycles.items():
+            name = stack[-1][0]
+            entry = stats.get(name)
+            if entry is None:
+                entry = stats[name] = ProcedureStats(name, 0, 0, 0)
+            entry.calls += self.calls.get(stack, 0)
+            entry.self_cycles += cycles
+            for caller in {frame[0] for frame in stack}:
+                if caller not in stats:
+                    stats[caller] = ProcedureStats(caller, 0, 0, 0)
+                stats[caller].total_cycles += cycles
+        return sorted(stats.values(), key=lambda s: -s.total_cycles)
+
+    def loops(self) -> List[LoopStats]:
+        """Cost of each loop, calls made from it included, costliest first."""
+        source_map = self.source_map
+        line_counts = self.line_counts()
+        stats = []
+        for kind, first_ir, label_ir, last_ir in source_map.loops:
+            start, end = source_map.line_range(first_ir, last_ir)
+            cycles = 0
+            for stack, lines in self.counts.items():
+                if any(start <= call < end for _, call in stack):
+                    cycles += self.cycles[stack]
+                    continue
+                for line, n in lines.items():
+                    if start <= line < end:
+                        cycles += n * COSTS[self.program[line][0]]
+            # The first line after the start label: the test, or the body of a REPEAT
+            top, _ = source_map.line_range(label_ir, last_ir)
+            source_line, column, procedure = source_map.ir[label_ir]
+            stats.append(
+                LoopStats(
+                    kind,
+                    source_line,
+                    column,
+                    source_map.procedures[procedure] if procedure >= 0 else "main",
+                    line_counts.get(top, 0),
+                    cycles,
+                )
+            )
+        return sorted(stats, key=lambda s: -s.cycles)
+
+    def collapsed(self) -> List[str]:
+        """Cycles per call stack, as 'main;caller;callee cycles' lines for flamegraph tools."""
+        merged: Dict[str, int] = defaultdict(int)
+        for stack, cycles in self.cycles.items():
+            merged[";".join(name for name, _ in stack)] += cycles
+        return [f"{path} {cycles}" for path, cycles in sorted(merged.items()) if cycles]
+
+    def format_table(self, top: int = 20, source: Optional[Sequence[str]] = None) -> str:
+        """Hot spots as text; source, the program's lines, adds their text."""
+        total = self.cost or 1
+        out = [f"Total: {self.cost} cycles, {self.steps} instructions", ""]
+
+        out.append(f"{'cycles':>12}{'%':>7}{'count':>10}  {'line':>5}  {'procedure':<16}")
+        for stat in self.source_lines()[:top]:
+            text = ""
+            if source is not None and 0 < stat.line <= len(source):
+                text = source[stat.line - 1].strip()
+            line = str(stat.line) if stat.line else "-"
+            out.append(
+                f"{stat.cycles:>12}{100 * stat.cycles / total:>7.1f}{stat.count:>10}  "
+                f"{line:>5}  {stat.procedure:<16}{text}".rstrip()
+            )
+
+        out += ["", f"{'total':>12}{'%':>7}{'self':>12}{'%':>7}{'calls':>10}  procedure"]
+        for stat in self.procedures():
+            out.append(
+                f"{stat.total_cycles:>12}{100 * stat.total_cycles / total:>7.1f}"
+                f"{stat.self_cycles:>12}{100 * stat.self_cycles / total:>7.1f}"
+                f"{stat.calls:>10}  {stat.procedure}"
+            )
+
+        loops = self.loops()
+        if loops:
+            out += ["", f"{'cycles':>12}{'%':>7}{'count':>10}  {'line':>5}  {'loop':<8}procedure"]
+            for stat in loops[:top]:
+                out.append(
+                    f"{stat.cycles:>12}{100 * stat.cycles / total:>7.1f}{stat.count:>10}  "
+                    f"{stat.line:>5}  {stat.kind:<8}{stat.procedure}"
+                )
+        return "\n".join(out)
+
+
+def profile_program(
+    program: List[Instruction],
+    source_map: SourceMap,
+    inputs: InputSource = (),
+    step_limit: Optional[int] = None,
+) -> Profile:
+    """
+    Run a program on a FastMachine, counting block executions per call
+    stack. The step limit is checked per block, so it may be reported up
+    to a block early.
+    """
+    if len(source_map.lines) != len(program):
+        raise ValueError(
+            f"source map covers {len(source_map.lines)} lines, the program has {len(program)}"
+        )
+    names = []
+    for line in range(len(program)):
+        origin = source_map.origin(line)
+        # The prologue and the final HALT are main's
+        names.append(origin.procedure if origin and origin.procedure else "main")
+
+    machine = FastMachine(program, inputs)
+    block_counts: Dict[Stack, Dict[int, int]] = {ROOT: {}}
+    calls: Dict[Stack, int] = defaultdict(int)
+    calls[ROOT] = 1
+    stack = ROOT
+    counts = block_counts[ROOT]
+    steps = machine.block_steps
+    remaining = step_limit
+    last_line = -1
+
+    block = machine.block_at(0)
+    while block is not None:
+        if block.index < 0:
+            block = machine.compiled(block.line)
+        index = block.index
+        line = block.line
+        if 0 <= line < len(names) and names[line] != stack[-1][0]:
+            moved = _moved(stack, names[line], last_line)
+            if len(moved) > len(stack):
+                calls[moved] += 1
+            stack = moved
+            counts = block_counts.get(stack)
+            if counts is None:
+                counts = block_counts[stack] = {}
+        if remaining is not None:
+            remaining -= steps[index]
+            if remaining < 0:
+                raise StepLimitExceeded(f"no HALT after {step_limit} steps", line)
+        counts[index] = counts.get(index, 0) + 1
+        last_line = line + steps[index] - 1
+        block = block()
+
+    line_counts = {}
+    for stack, counts in block_counts.items():
+        lines: Dict[int, int] = defaultdict(int)
+        for index, n in counts.items():
+            start = machine.block_lines[index]
+            for line in range(start, start + steps[index]):
+                lines[line] += n
+        line_counts[stack] = dict(lines)
+    return Profile(program, source_map, line_counts, dict(calls), machine.output)
+
+
+def _moved(stack: Stack, name: str, call_line: int) -> Stack:
+    """The stack once control passes into name's code: a return to a caller, or a call."""
+    for depth in range(len(stack) - 1, -1, -1):
+        if stack[depth][0] == name:
+            return stack[: depth + 1]
+    return stack + ((name, call_line),)
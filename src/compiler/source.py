@@ -0,0 +1,60 @@
+# src/compiler/source.py
+import mmap
+import os
+from typing import List, Optional, Union
+
+# Program text as accepted by the pipeline: decoded text, or raw UTF-8 bytes
+# (including a memory-mapped file) that are handed to tree-sitter as they are
+Source = Union[str, bytes, mmap.mmap]
+
+
+def read_source(path: str) -> Union[bytes, mmap.mmap]:
+    """
+    Map a source file into memory, read-only. Nothing is copied up front:
+    tree-sitter parses straight from the mapping and token text is sliced
+    out of it on demand. The mapping outlives the file handle and is
+    released with its last reference (parse trees keep one).
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""  # empty files can't be mapped
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def source_bytes(source: Source) -> Union[bytes, mmap.mmap]:
+    return source.encode("utf8") if isinstance(source, str) else source
+
+
+class LineTable:
+    """
+    Lines of a source, for error messages. Line offsets are only computed on
+    first access and single lines are decoded when asked for, so a program
+    that compiles cleanly never pays for it. Indexable like a list of lines.
+    """
+
+    def __init__(self, source: Source):
+        self.source = source_bytes(source)
+        self._starts: Optional[List[int]] = None
+
+    def _line_starts(self) -> List[int]:
+        if self._starts is None:
+            starts = [0]
+            offset = self.source.find(b"\n")
+            while offset != -1:
+                starts.append(offset + 1)
+                offset = self.source.find(b"\n", offset + 1)
+            if starts[-1] == len(self.source) and len(starts) > 1:
+                starts.pop()  # a final newline doesn't start another line
+            self._starts = starts
+        return self._starts
+
+    def __len__(self) -> int:
+        return len(self._line_starts()) if len(self.source) else 0
+
+    def __getitem__(self, index: int) -> str:
+        starts = self._line_starts()
+        start = starts[index]
+        end = self.source.find(b"\n", start)
+        if end == -1:
+            end = len(self.source)
+        return self.source[start:end].rstrip(b"\r").decode("utf8", errors="replace")
@@ -0,0 +1,117 @@
+# src/compiler/source_map.py
+import json
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .intermediate_rep.IR_ops import IRInstruction, IRLabel, LabelType
+
+VERSION = 1
+
+# Labels opening the code of a procedure, the arithmetic routines included
+_PROCEDURE_LABELS = {LabelType.PROC_START, LabelType.MAIN_START}
+_LOOP_LABELS = {
+    LabelType.WHILE_START: "WHILE",
+    LabelType.FOR_START: "FOR",
+    LabelType.REPEAT_START: "REPEAT",
+}
+
+
+class Origin(NamedTuple):
+    """Where one line of VM code comes from."""
+    ir_index: int
+    line: int  # 1-based source line, 0 if the code has no source (arithmetic routines)
+    column: int
+    procedure: Optional[str]
+
+
+@dataclass
+class SourceMap:
+    """
+    Provenance of compiled code: for each VM line, the IR instruction it
+    was generated from, and for each IR instruction, the source position
+    of its command and the procedure it belongs to. Lines with no IR
+    instruction behind them (array and constant setup, the final HALT)
+    map to -1.
+    """
+    procedures: List[str]
+    ir: List[Tuple[int, int, int]]  # line, column, index in procedures (-1: none)
+    lines: List[int]  # IR index per VM line
+    # Kind, first IR index, index of the start label and last IR index of each loop
+    loops: List[Tuple[str, int, int, int]] = field(default_factory=list)
+
+    @classmethod
+    def build(cls, ir: List[IRInstruction], lines: List[int]) -> "SourceMap":
+        """Map of code emitted from ir, lines as collected by VMCodeGenerator.iter_emit."""
+        procedures: List[str] = []
+        numbers: Dict[str, int] = {}
+        current = -1  # the entry jump comes before any procedure
+        entries = []
+        # A loop's own instructions (setup, test, jump back, end label) carry
+        # its location and enclose its body, so they give its extent
+        loop_starts = []
+        last_at: Dict[Tuple[int, int], int] = {}
+        for index, instruction in enumerate(ir):
+            if type(instruction) is IRLabel:
+                if instruction.label_type in _PROCEDURE_LABELS:
+                    name = instruction.procedure
+                    if name not in numbers:
+                        numbers[name] = len(procedures)
+                        procedures.append(name)
+                    current = numbers[name]
+                elif instruction.label_type in _LOOP_LABELS and instruction.location:
+                    loop_starts.append(index)  # the arithmetic routines' have no source
+            location = instruction.location
+            if location is None:
+                entries.append((0, 0, current))
+            else:
+                entries.append((location.line, location.column, current))
+                last_at[location] = index
+
+        loops = []
+        for start in loop_starts:
+            location = ir[start].location
+            first = start
+            while first > 0 and ir[first - 1].location == location:
+                first -= 1  # FOR sets its iterator up before the label
+            loops.append((_LOOP_LABELS[ir[start].label_type], first, start, last_at[location]))
+        return cls(procedures, entries, lines, loops)
+
+    def origin(self, line: int) -> Optional[Origin]:
+        """Origin of the VM line (0-based), None if no IR instruction produced it."""
+        index = self.lines[line]
+        if index < 0:
+            return None
+        source_line, column, procedure = self.ir[index]
+        name = self.procedures[procedure] if procedure >= 0 else None
+        return Origin(index, source_line, column, name)
+
+    def line_range(self, first_ir: int, last_ir: int) -> Tuple[int, int]:
+        """VM lines [start, end) generated from IR instructions first_ir..last_ir."""
+        # Sorted but for the final HALT: the prologue's -1s come first
+        hi = len(self.lines) - 1
+        return bisect_left(self.lines, first_ir, 0, hi), bisect_right(self.lines, last_ir, 0, hi)
+
+    def write(self, path: str) -> None:
+        data = {
+            "version": VERSION,
+            "procedures": self.procedures,
+            "ir": self.ir,
+            "lines": self.lines,
+            "loops": self.loops,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "SourceMap":
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != VERSION:
+            raise ValueError(f"{path}: unsupported source map version {data.get('version')!r}")
+        return cls(
+            data["procedures"],
+            [tuple(entry) for entry in data["ir"]],
+            data["lines"],
+            [tuple(loop) for loop in data.get("loops", [])],
+        )
@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Set, Tuple
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 
 @dataclass
@@ -30,13 +30,29 @@ class Symbol:
         """
 
 
+@dataclass
+class Scope:
+    """Symbols declared in one procedure, or globally when procedure is None."""
+
+    procedure: Optional[str]
+    symbols: Dict[str, Symbol] = field(default_factory=dict)
+
+
 class SymbolTable:
+    """
+    Symbols live in one Scope per procedure plus the global one, keyed by
+    their bare names, so a lookup is one or two dict accesses on the
+    scope entered last and a procedure's symbols go away with its scope.
+    """
+
     def __init__(self):
-        self.symbols: Dict[str, Symbol] = {}
+        self.global_scope = Scope(None)
+        self.scopes: Dict[Optional[str], Scope] = {None: self.global_scope}
         self.procedures: Dict[str, List[Tuple[str, bool]]] = (
             {}
         )  # procedure_name -> [(param_name, is_array)]
         self.current_procedure: Optional[str] = None
+        self.current_scope = self.global_scope
         self.costly_operations: Set[str] = set()
 
     def add_procedure(self, name: str, parameters: List[Tuple[str, bool]]) -> None:
@@ -60,20 +76,30 @@ class SymbolTable:
     def enter_procedure(self, name: str):
         """Enter a procedure scope."""
         self.current_procedure = name
+        self.current_scope = self.scope(name)
 
     def exit_procedure(self):
         """Exit the current procedure scope. Used when leaving a procedure to set a global scope."""
         self.current_procedure = None
+        self.current_scope = self.global_scope
 
     def get_current_scope_name(self) -> str:
         """Get current scope identifier (procedure name or 'global')."""
         return self.current_procedure if self.current_procedure else "global"
 
-    def make_scoped_name(self, name: str, scope: Optional[str] = None) -> str:
-        """Create a scoped name based on current or specified scope."""
-        if scope and scope != "global":
-            return f"{scope}_{name}"
-        return name
+    def scope(self, procedure: Optional[str]) -> Scope:
+        """Scope of a procedure (None or 'global' for the global one), created on first use."""
+        if procedure == "global":
+            procedure = None
+        scope = self.scopes.get(procedure)
+        if scope is None:
+            scope = self.scopes[procedure] = Scope(procedure)
+        return scope
+
+    def iter_symbols(self) -> Iterator[Symbol]:
+        """Every symbol, scope by scope."""
+        for scope in self.scopes.values():
+            yield from scope.symbols.values()
 
     def add_symbol(
         self,
@@ -92,12 +118,15 @@ class SymbolTable:
         effective_procedure = (
             procedure_name if procedure_name is not None else self.current_procedure
         )
-        full_name = self.make_scoped_name(name, effective_procedure)
+        if procedure_name is None:
+            scope = self.current_scope
+        else:
+            scope = self.scope(procedure_name)
 
-        if full_name in self.symbols:
+        if name in scope.symbols:
             raise ValueError(f"Symbol {name} already defined")
 
-        self.symbols[full_name] = Symbol(
+        scope.symbols[name] = Symbol(
             name=name,
             symbol_type=symbol_type,
             is_array=is_array,
@@ -115,27 +144,14 @@ class SymbolTable:
 
     def lookup(self, name: str) -> Optional[Symbol]:
         """Look up a symbol, checking both current procedure and global scope."""
-        # First try procedure-scoped lookup
-        if self.current_procedure:
-            scoped_name = f"{self.current_procedure}_{name}"
-            if scoped_name in self.symbols:
-                return self.symbols[scoped_name]
-
-        # Then try global scope
-        if name in self.symbols:
-            return self.symbols[name]
-
-        return None
+        symbol = self.current_scope.symbols.get(name)
+        if symbol is None and self.current_scope is not self.global_scope:
+            symbol = self.global_scope.symbols.get(name)
+        return symbol
 
     def lookup_current_scope(self, name: str) -> Optional[Symbol]:
         """Look up a symbol only in the current scope."""
-        if self.current_procedure:
-            # In procedure scope - only look for procedure-scoped symbol
-            scoped_name = f"{self.current_procedure}_{name}"
-            return self.symbols.get(scoped_name)
-        else:
-            # In global scope - only look for global symbol
-            return self.symbols.get(name)
+        return self.current_scope.symbols.get(name)
 
     def is_defined(self, name: str) -> bool:
         """Check if a symbol is defined in current scope."""
@@ -189,21 +205,24 @@ class SymbolTable:
             raise ValueError(f"Symbol {name} not found")
 
     def prune_uncalled_procedures(self):
-        for symbol in list(self.symbols.values()):
-            if symbol.symbol_type == "procedure" and not symbol.is_used:
-
-                for name, _ in list(self.symbols.items()):
-                    if name.startswith(symbol.name + "_"):
-                        del self.symbols[name]
-
-                del self.symbols[symbol.name]
-                del self.procedures[symbol.name]
+        """Drop procedures never called, together with their scopes."""
+        globals_ = self.global_scope.symbols
+        uncalled = [
+            name
+            for name, symbol in globals_.items()
+            if symbol.symbol_type == "procedure" and not symbol.is_used
+        ]
+        for name in uncalled:
+            del globals_[name]
+            del self.procedures[name]
+            self.scopes.pop(name, None)
 
     def print_table(self):
         """Print the symbol table for debugging."""
         print("Symbol table:")
-        for name, symbol in self.symbols.items():
-            print(f"  {name}: {symbol}")
+        for scope in self.scopes.values():
+            for name, symbol in scope.symbols.items():
+                print(f"  {scope.procedure or 'global'}.{name}: {symbol}")
         print("Procedure table:")
         for name, params in self.procedures.items():
             print(f"  {name}: {params}")
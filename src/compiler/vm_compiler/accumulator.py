@@ -0,0 +1,85 @@
+# src/compiler/vm_compiler/accumulator.py
+from typing import Iterable, List, Optional, Set
+
+from .vm_operators import *
+
+# Ops after which nothing is known about p0: control may arrive from
+# elsewhere (labels, the line after a jump, a call returning) or p0 holds
+# something computed
+_FORGET = (
+    LABEL, JUMP, JUMPLABEL, JZERO, JZERO_LABEL, JPOS, JPOS_LABEL, JNEG, JNEG_LABEL,
+    RETURN, HALT, SET_HERE, ADD, SUB, ADDI, SUBI, HALF,
+)
+
+
+class AccumulatorTracker:
+    """
+    What p0 holds within a basic block, to drop loads that would leave it
+    unchanged: a LOAD of a cell p0 was just stored to or loaded from, a
+    LOADI through a pointer it was just loaded through, or a SET of the
+    value it holds. Everything is forgotten at labels, jumps, calls and
+    returns, and when p0 is computed.
+    """
+
+    def __init__(self):
+        self.cells: Set[int] = set()  # a with M[a] == p0
+        self.pointers: Set[int] = set()  # a with M[M[a]] == p0
+        self.value: Optional[int] = None  # p0, if a known constant
+        self.dropped = 0
+
+    def reset(self) -> None:
+        self.cells.clear()
+        self.pointers.clear()
+        self.value = None
+
+    def filter(self, ops: Iterable[base_op]) -> List[base_op]:
+        """ops without the redundant loads, tracking p0 through the rest."""
+        kept = []
+        for op in ops:
+            if self.redundant(op):
+                self.dropped += 1
+            else:
+                self.update(op)
+                kept.append(op)
+        return kept
+
+    def redundant(self, op: base_op) -> bool:
+        kind = type(op)
+        if kind is LOAD:
+            return op.val in self.cells
+        if kind is LOADI:
+            return op.val in self.pointers
+        if kind is SET:
+            return op.val == self.value
+        return False
+
+    def update(self, op: base_op) -> None:
+        """Account for op having run."""
+        kind = type(op)
+        if kind is LOAD:
+            self.reset()
+            if op.val != 0:
+                self.cells.add(op.val)
+        elif kind is STORE:
+            if op.val != 0:
+                self.cells.add(op.val)
+                # M[op.val] is p0 now, so what it pointed to isn't
+                self.pointers.discard(op.val)
+        elif kind is LOADI:
+            self.reset()
+            if op.val != 0:
+                self.pointers.add(op.val)
+        elif kind is STOREI:
+            # Cells equal to p0 stay so, but any pointer may have changed
+            self.pointers.clear()
+        elif kind is SET:
+            self.reset()
+            self.value = op.val
+        elif kind is GET:
+            if op.val == 0:
+                self.reset()
+            else:
+                self.cells.discard(op.val)
+                self.pointers.clear()
+        elif kind in _FORGET:
+            self.reset()
@@ -1,51 +1,107 @@
 from .vm_operators import *
-from typing import List
+from typing import List, Optional
+
+# Label-form jumps and the mnemonic they resolve to
+LABEL_JUMPS = {
+    JUMPLABEL: "JUMP",
+    JZERO_LABEL: "JZERO",
+    JPOS_LABEL: "JPOS",
+    JNEG_LABEL: "JNEG",
+}
+
+
+class LabelTable:
+    """
+    Where labels landed in the final code. Label ids are small dense
+    integers (see LabelManager), so lines live in a flat array. A label
+    whose line is an unconditional JUMP also records that JUMP's target,
+    which lets jumps be threaded: a jump to such a label goes straight to
+    where the chain of JUMPs ends.
+    """
+
+    def __init__(self):
+        self.position: List[int] = []  # label id -> line, -1 while unplaced
+        self.alias: List[int] = []  # label id -> label its line JUMPs to, 0 if none
+        self.lines = 0  # instructions seen so far
+        self._placed: List[int] = []  # labels placed since the last instruction
+
+    def add(self, item: base_op) -> None:
+        """Account for the next op of the label-form code."""
+        kind = type(item)
+        if kind is LABEL:
+            self.place(item.label_id)
+        else:
+            self.instruction(item.label_id if kind is JUMPLABEL else 0)
+
+    def place(self, label_id: int) -> None:
+        """Put a label on the next instruction."""
+        self.place_at(label_id, self.lines)
+        self._placed.append(label_id)
+
+    def place_at(self, label_id: int, line: int, jump_to: int = 0) -> None:
+        """Put a label on an instruction already counted; jump_to is the label it JUMPs to, if any."""
+        if label_id >= len(self.position):
+            grow = label_id + 1 - len(self.position)
+            self.position.extend([-1] * grow)
+            self.alias.extend([0] * grow)
+        self.position[label_id] = line
+        self.alias[label_id] = jump_to
+
+    def instruction(self, jump_to: int = 0) -> None:
+        """Count one instruction; jump_to is the label it JUMPs to, if any."""
+        if self._placed:
+            if jump_to:
+                for label_id in self._placed:
+                    self.alias[label_id] = jump_to
+            self._placed.clear()
+        self.lines += 1
+
+    def target(self, label_id: int) -> int:
+        """Line a jump to label_id should go to, after threading."""
+        alias = self.alias
+        # A cycle of JUMPs loops forever wherever it's entered; stop anywhere
+        for _ in range(len(alias)):
+            if label_id >= len(alias) or not alias[label_id]:
+                break
+            label_id = alias[label_id]
+        if label_id >= len(self.position) or self.position[label_id] < 0:
+            raise ValueError(f"Jump to undefined label L{label_id}")
+        return self.position[label_id]
+
+
+def _resolve(item: base_op, line: int, table: LabelTable) -> str:
+    kind = type(item)
+    mnemonic = LABEL_JUMPS.get(kind)
+    if mnemonic is not None:
+        return f"{mnemonic} {table.target(item.label_id) - line}"
+    if kind is SET_HERE:
+        return f"SET {item.offset + line}"
+    return str(item)
+
 
 def correct_labels(code: List[base_op]) -> List[str]:
-    
-    label_map = {} #id: line
-    counter = 0
-    new_code = []
-    
+    """
+    Resolve label-form VM code into final code with relative jumps.
+    Code is emitted in a single pass; jumps get a placeholder line that is
+    backpatched once every label is placed.
+    """
+    table = LabelTable()
+    lines: List[Optional[str]] = []
+    jumps = []  # (line, item) to backpatch
+
     for item in code:
-        if isinstance(item, LABEL):
-            label_map[item.label_id] = counter
-        else:
-            counter += 1
-            new_code.append(item)
-            
-    corrected_code = []
-    
-    for curr, item in enumerate(new_code):
-        if isinstance(item, JUMPLABEL):
-            
-            offset = label_map[item.label_id] - curr
-            corrected_code.append(str(JUMP(offset)))
-            
-        elif isinstance(item, JZERO_LABEL):
-            offset = label_map[item.label_id] - curr
-            corrected_code.append(str(JZERO(offset)))
-        
-        elif isinstance(item, JPOS_LABEL):
-            offset = label_map[item.label_id] - curr
-            corrected_code.append(str(JPOS(offset)))
-            
-        elif isinstance(item, JNEG_LABEL):
-            offset = label_map[item.label_id] - curr
-            corrected_code.append(str(JNEG(offset)))
-        
-        elif isinstance(item, LABEL):
+        table.add(item)
+        if type(item) is LABEL:
             continue
-        
-        elif isinstance(item, SET_HERE):
-            offset = item.offset + curr
-            corrected_code.append(str(SET(offset)))
-            # corrected_code.append(str(item))
-        
+        if type(item) in LABEL_JUMPS:
+            jumps.append((len(lines), item))
+            lines.append(None)
         else:
-            corrected_code.append(str(item))
-            
-    return corrected_code
+            lines.append(_resolve(item, len(lines), table))
+
+    for line, item in jumps:
+        lines[line] = _resolve(item, line, table)
+    return lines
 
 
 # def test_label_correct():
@@ -0,0 +1,266 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, IO, Iterable, Iterator, List, Tuple, Union
+
+from ..intermediate_rep.IR_ops import Variable
+from ..pre_assembler.memory_map import MemoryMap
+from .label_correct import LABEL_JUMPS, LabelTable
+from .vm_operators import *
+
+_TEMP_NAME = re.compile(r"t(\d+)$")
+# Object lines ObjectWriter.write() collects before writing them out
+_WRITE_BATCH = 1024
+
+
+class SymbolRef:
+    """An address not known yet, printed as @<symbol index>"""
+
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        self.index = index
+
+    def __str__(self) -> str:
+        return f"@{self.index}"
+
+
+class RelocatingMemoryMap:
+    """
+    Stands in for MemoryMap while code is generated before all variables are
+    known: every address is a SymbolRef to the variable's name, resolved by
+    link() once the final MemoryMap can be built. Names rather than ids,
+    as code lowered in another process numbers its variables on its own.
+    """
+
+    def __init__(self):
+        self.symbols: Dict[str, SymbolRef] = {}
+        self.names: List[str] = []
+
+    def get_address(self, var: Variable) -> SymbolRef:
+        return self.symbol(var.name)
+
+    def symbol(self, var_name: str) -> SymbolRef:
+        ref = self.symbols.get(var_name)
+        if ref is None:
+            ref = self.symbols[var_name] = SymbolRef(len(self.names))
+            self.names.append(var_name)
+        return ref
+
+
+class ProcLabel:
+    """
+    Entry label of a procedure compiled elsewhere, for code generated apart
+    from the rest of the program; printed as P<name>.
+    """
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __str__(self) -> str:
+        return f"P{self.name}"
+
+
+# Kinds of RelocatableObject relocations
+SYMBOL = 0  # value: variable name
+TEMP = 1  # value: N of a temp tN, numbered from 0 in the object
+LABEL_ID = 2  # value: local label id
+PROCEDURE = 3  # value: procedure name, for its entry label
+HERE = 4  # value: line in the object a SET_HERE stands for
+
+
+@dataclass
+class RelocatableObject:
+    """
+    VM code of one procedure generated on its own (see relocatable_object()),
+    ready to be moved into a program without being parsed again: the text
+    is a str.format() template whose fields are the operands that depend
+    on where it goes. ObjectWriter.append() puts it into a program.
+    """
+
+    template: str  # object lines; field k is the value of relocations[k]
+    relocations: List[Tuple[int, Union[int, str]]]  # (kind, value)
+    labels: List[Tuple[int, int, int]]  # local label id, line, field its line JUMPs to or -1
+    lines: int
+    first_jump: int  # field of the label line 0 JUMPs to, or -1
+    ir_instructions: int = 0  # IR the code was generated from, for statistics
+
+
+def relocatable_object(code: Iterable[base_op], symbols: RelocatingMemoryMap) -> RelocatableObject:
+    """
+    Object of label-form code whose addresses come from symbols. Symbols,
+    label ids, jumps to other procedures' entries (ProcLabel) and SET_HERE
+    lines are left as template fields, one per distinct value, for the
+    linking process to fill in.
+    """
+    fields: Dict[Tuple[int, Union[int, str]], int] = {}
+    relocations = []
+
+    def field(kind: int, value) -> int:
+        key = (kind, value)
+        number = fields.get(key)
+        if number is None:
+            number = fields[key] = len(relocations)
+            relocations.append(key)
+        return number
+
+    names = symbols.names
+    lines = []
+    labels = []  # local label id, line
+    jumps: Dict[int, int] = {}  # line -> field of the label its JUMP goes to
+    for item in code:
+        kind = type(item)
+        if kind is LABEL:
+            labels.append((item.label_id, len(lines)))
+            continue
+        mnemonic = LABEL_JUMPS.get(kind)
+        if mnemonic is not None:
+            target = item.label_id
+            if isinstance(target, ProcLabel):
+                number = field(PROCEDURE, target.name)
+            else:
+                number = field(LABEL_ID, target)
+            if kind is JUMPLABEL:
+                jumps[len(lines)] = number
+            lines.append(f"{mnemonic} L{{{number}}}")
+        elif kind is SET_HERE:
+            # Lines move with the object, so each SET_HERE gets a field of its own
+            number = len(relocations)
+            relocations.append((HERE, len(lines) + item.offset))
+            lines.append(f"SET_HERE {{{number}}}")
+        elif type(getattr(item, "val", None)) is SymbolRef:
+            name = names[item.val.index]
+            match = _TEMP_NAME.match(name)
+            number = field(TEMP, int(match.group(1))) if match else field(SYMBOL, name)
+            mnemonic = str(item).partition(" ")[0]  # not always the class name (RETURN)
+            lines.append(f"{mnemonic} @{{{number}}}")
+        else:
+            lines.append(str(item))
+
+    template = "".join(line + "\n" for line in lines)
+    return RelocatableObject(
+        template,
+        relocations,
+        [(label_id, line, jumps.get(line, -1)) for label_id, line in labels],
+        len(lines),
+        jumps.get(0, -1),
+    )
+
+
+class ObjectWriter:
+    """
+    Writes label-form VM code with unresolved addresses as text, one
+    instruction per line, for link() to finish. Labels aren't written: their
+    lines go to a LabelTable, so what stays in memory is that table and the
+    symbol names, however long the code gets. Object lines:
+
+        LOAD @3         address of symbol 3
+        JPOS L12        jump to label 12
+        SET_HERE 40     SET to object line 40, before the prologue is added
+    """
+
+    def __init__(self, out: IO[str]):
+        self.out = out
+        self.labels = LabelTable()
+
+    @property
+    def lines(self) -> int:
+        return self.labels.lines
+
+    def write(self, code: Iterable[base_op]) -> None:
+        # Lines go out in batches: every write to a read-write text file
+        # also resets its decoder, a Python-level call
+        labels = self.labels
+        batch = []
+        for item in code:
+            kind = type(item)
+            if kind is not LABEL:
+                mnemonic = LABEL_JUMPS.get(kind)
+                if mnemonic is not None:
+                    batch.append(f"{mnemonic} L{item.label_id}\n")
+                elif kind is SET_HERE:
+                    batch.append(f"SET_HERE {item.offset + labels.lines}\n")
+                else:
+                    batch.append(f"{item}\n")
+                if len(batch) >= _WRITE_BATCH:
+                    self.out.write("".join(batch))
+                    batch.clear()
+            labels.add(item)
+        if batch:
+            self.out.write("".join(batch))
+
+    def append(
+        self,
+        obj: RelocatableObject,
+        symbols: RelocatingMemoryMap,
+        label_base: int,
+        temp_base: int,
+        proc_info: Dict,
+    ) -> None:
+        """
+        Add a procedure's RelocatableObject: its label ids are moved up by
+        label_base, its temps tN renamed to t(N + temp_base) and its symbols
+        mapped into symbols, the same relocation ProcedureFragment.relocated
+        applies to its IR. Entry labels of called procedures come from
+        proc_info. Only the object's relocations are visited; its lines are
+        filled in by a single format() of the template.
+        """
+        labels = self.labels
+        base = labels.lines
+        values = []
+        for kind, value in obj.relocations:
+            if kind == LABEL_ID:
+                values.append(value + label_base)
+            elif kind == TEMP:
+                values.append(symbols.symbol(f"t{value + temp_base}").index)
+            elif kind == SYMBOL:
+                values.append(symbols.symbol(value).index)
+            elif kind == PROCEDURE:
+                values.append(proc_info[value].begin_id)
+            else:
+                values.append(value + base)
+        self.out.write(obj.template.format(*values))
+
+        if obj.lines:
+            # Labels placed just before the object land on its first line
+            labels.instruction(values[obj.first_jump] if obj.first_jump >= 0 else 0)
+            labels.lines += obj.lines - 1
+        for label_id, line, jump in obj.labels:
+            if line < obj.lines:
+                labels.place_at(label_id + label_base, base + line, values[jump] if jump >= 0 else 0)
+            else:
+                # The object's last labels belong to whatever comes next
+                labels.place(label_id + label_base)
+
+
+def link(
+    prologue: List[base_op],
+    objects: Iterable[str],
+    labels: LabelTable,
+    symbols: List[str],
+    memory_map: MemoryMap,
+) -> Iterator[str]:
+    """
+    Final VM code: the prologue (which holds no labels) followed by the object
+    lines, with symbols replaced by their addresses, jumps by relative
+    offsets and SET_HEREs by absolute lines.
+    """
+    for item in prologue:
+        yield str(item)
+
+    base = len(prologue)
+    addresses = [memory_map.address_of(name) for name in symbols]
+    for line, text in enumerate(objects):
+        text = text.rstrip("\n")
+        mnemonic, _, operand = text.partition(" ")
+        if not operand:
+            yield text
+        elif operand[0] == "@":
+            yield f"{mnemonic} {addresses[int(operand[1:])]}"
+        elif operand[0] == "L":
+            yield f"{mnemonic} {labels.target(int(operand[1:])) - line}"
+        elif mnemonic == "SET_HERE":
+            yield f"SET {int(operand) + base}"
+        else:
+            yield text
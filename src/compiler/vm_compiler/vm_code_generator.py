@@ -1,10 +1,24 @@
-from typing import List, Dict, Optional, Tuple
+import tempfile
+from typing import Iterator, List, Dict, Optional, Tuple
+from ..dispatch import TypeDispatch
 from ..intermediate_rep.IR_ops import *
 from ..pre_assembler.memory_map import MemoryMap
+from .accumulator import AccumulatorTracker
 from .vm_operators import *
 from .label_correct import correct_labels
+from .linker import ObjectWriter, link
+
+# Buffer of the temporary file stream() emits to
+OBJECT_BUFFER = 2**20
+
+def _unsupported(self, op: IRInstruction):
+    raise RuntimeError(f"NOT WORKGWIRNG {op.__class__.__name__}")
+
 
 class VMCodeGenerator:
+    # Instruction handlers by IR instruction type
+    instructions = TypeDispatch(default=_unsupported)
+
     def __init__(self, memory_map: MemoryMap, variables, proc_info, costly_ops={'*', '/', '%'}):
         self.memory_map = memory_map
         self.code: List[str] = []
@@ -12,6 +26,11 @@ class VMCodeGenerator:
         self.costly_ops = costly_ops
         self.proc_info = proc_info
         self.instruction_counter = 0
+        self.accumulator = AccumulatorTracker()
+        # Arithmetic routine operands, registered with the first variables
+        self.arg1, self.arg2, self.result, self.result2, self.temp = (
+            variables[name] for name in ("arg1", "arg2", "result", "result2", "temp")
+        )
         
         
         self.debug = False
@@ -36,90 +55,105 @@ class VMCodeGenerator:
             
         
         
-    def generate(self, ir_code: List[IRInstruction]) -> List[base_op]:
+    def generate(self, ir_code: List[IRInstruction]) -> List[str]:
         """Generate VM code from IR instructions"""
-        self.code = []
-        
+        return correct_labels(self.emit(ir_code))
+
+    def emit(self, ir_code: List[IRInstruction]) -> List[base_op]:
+        """Generate VM code with symbolic labels, before correct_labels resolves them"""
+        self.code = list(self.iter_emit(ir_code))
+        return self.code
+
+    def iter_emit(
+        self, ir_code: List[IRInstruction], origins: Optional[List[int]] = None
+    ) -> Iterator[base_op]:
+        """
+        emit(), one op at a time. If origins is given, the index in ir_code
+        of the instruction behind every op but the labels, i.e. behind each
+        line of the final code, is appended to it; -1 for the prologue and
+        the closing HALT.
+        """
+        self.instruction_counter = 0
+        self.accumulator.reset()
+
         if self.debug:
             print("Generating code")
             for instruction in ir_code:
                 print(instruction.print_full()) 
         
+        if origins is None:
+            yield from self.prologue()
+            for instruction in ir_code:
+                yield from self.compile_ir(instruction)
+        else:
+            for op in self.prologue():
+                origins.append(-1)
+                yield op
+            for index, instruction in enumerate(ir_code):
+                for op in self.compile_ir(instruction):
+                    if type(op) is not LABEL:
+                        origins.append(index)
+                    yield op
+        
+        if origins is not None:
+            origins.append(-1)
+        yield HALT()
+        self.instruction_counter += 1
+
+    def prologue(self) -> Iterator[base_op]:
+        """Array pointers and constants, set up before the program runs"""
         for k,v in self.variables.items():
             
             if v.is_array and not v.is_pointer:
                 # print(f"Allocating array {v.name} {v.print_full()}")
-                _, array_start_adress, _ = self.memory_map.get_array_info(v.name)
-                self.code.append(SET(array_start_adress))
-                self.code.append(STORE(self.memory_map.get_address(v.name)))
+                _, array_start_adress, _ = self.memory_map.get_array_info(v)
+                yield SET(array_start_adress)
+                yield STORE(self.memory_map.get_address(v))
                 self.instruction_counter += 2             
-            
-            
-        
         
-        self.generate_consts()
-        
-        for instruction in ir_code:
-            self.code.extend(self.compile_ir(instruction))
-            
-        
-        self.code.append(HALT())
-        self.instruction_counter += 1
-        
-        self.code = correct_labels(self.code)
-            
-        return self.code
+        yield from self.generate_consts()
+
+    def stream(self, ir_code: List[IRInstruction], origins: Optional[List[int]] = None) -> Iterator[str]:
+        """
+        Final VM code, line by line, without materializing the program.
+        The code is emitted once, in label form, to a temporary file (see
+        ObjectWriter), which link() then reads back with every label placed.
+        That costs a write and a read of the text, which is cheaper than
+        emitting twice: a second pass would run every handler and the
+        accumulator tracker again.
+        """
+        with tempfile.TemporaryFile("w+", buffering=OBJECT_BUFFER) as objects:
+            writer = ObjectWriter(objects)
+            writer.write(self.iter_emit(ir_code, origins))
+            objects.seek(0)
+            yield from link([], objects, writer.labels, [], self.memory_map)
     
-    def generate_consts(self):
+    def generate_consts(self) -> Iterator[base_op]:
         for k,v in self.variables.items():
             if v.is_const:
-                adress = self.memory_map.get_address(v.name)
-                self.code.extend([
-                    SET(v.const_value),
-                    STORE(adress)
-                ])
+                adress = self.memory_map.get_address(v)
+                yield SET(v.const_value)
+                yield STORE(adress)
                 self.instruction_counter += 2
             
     
     
     def compile_ir(self, op: IRInstruction) -> List[str]:
-        if isinstance(op, IRLabel):
-            # self.instruction_counter += 1
-            if self.debug:
-                print(f"IRLabel {op}")
-                print("----"*8)
-            
-            
-            
-            return [LABEL(op.label_id)] 
-        elif isinstance(op, IRRead):
-            return self.compile_read_op(op) 
-        elif isinstance(op, IRWrite):            
-            return self.compile_write_op(op)
+        """
+        VM code of one IR instruction. Handlers start from scratch, loading
+        p0 as if nothing was in it; loads of what it still holds from the
+        previous instructions are dropped (see AccumulatorTracker).
+        """
+        return self.accumulator.filter(self.instructions[type(op)](self, op))
 
-        elif isinstance(op, IRAssign):            
-            return self.compile_assign_op(op)
-        elif isinstance(op, IRCondJump):
-            return self.compile_cond_jump_op(op)
-        elif isinstance(op, IRArrayRead):
-            return self.compile_array_read_op(op)
-        elif isinstance(op, IRArrayWrite):
-            return self.compile_array_write_op(op)
-        elif isinstance(op, IRJump):
-            return self.compile_jump_op(op)
-        elif isinstance(op, IRHalf):
-            return self.compile_half_op(op)
-        elif isinstance(op, IRBinaryOp):
-            return self.compile_binary_op(op)
-        elif isinstance(op, IRReturn):
-            return self.compile_return_op(op)
-        elif isinstance(op, IRProcCall):
-            return self.compile_proc_call_op(op)
-        else:
-                   
-            raise RuntimeError(f"NOT WORKGWIRNG {op.__class__.__name__}")
-        
-        
+    @instructions.register(IRLabel)
+    def compile_label_op(self, op: IRLabel) -> List[str]:
+        if self.debug:
+            print(f"IRLabel {op}")
+            print("----"*8)
+        return [LABEL(op.label_id)]
+
+    @instructions.register(IRRead)
     def compile_read_op(self, op: IRRead) -> List[str]:
         
         code = []
@@ -127,12 +161,12 @@ class VMCodeGenerator:
         if isinstance(target, BY_REFERENCE):
             
             code.append(GET(0))
-            code.append(STOREI(self.memory_map.get_address(target.name)))
+            code.append(STOREI(self.memory_map.get_address(target)))
             self.instruction_counter += 2
         else:
             
             code.append(GET(0))
-            code.append(STORE(self.memory_map.get_address(target.name)))
+            code.append(STORE(self.memory_map.get_address(target)))
             self.instruction_counter += 2
             
         if self.debug:
@@ -143,17 +177,18 @@ class VMCodeGenerator:
         
         return code
         
+    @instructions.register(IRWrite)
     def compile_write_op(self, op: IRWrite) -> List[str]:
         
         code = []
         value = op.value
         
         if isinstance(value, BY_REFERENCE):
-            code.append(LOADI(self.memory_map.get_address(value.name)))
+            code.append(LOADI(self.memory_map.get_address(value)))
             code.append(PUT(0))
             self.instruction_counter += 2
         else:
-            code.append(LOAD(self.memory_map.get_address(value.name)))
+            code.append(LOAD(self.memory_map.get_address(value)))
             code.append(PUT(0))
             self.instruction_counter += 2
         
@@ -165,6 +200,7 @@ class VMCodeGenerator:
         
         return code       
 
+    @instructions.register(IRAssign)
     def compile_assign_op(self, op: IRAssign) -> List[str]:
         
         code = []
@@ -172,24 +208,24 @@ class VMCodeGenerator:
         value = op.value
         
         if isinstance(value, BY_REFERENCE):
-            code.append(LOADI(self.memory_map.get_address(value.name)))
+            code.append(LOADI(self.memory_map.get_address(value)))
             
             if isinstance(target, BY_REFERENCE):
-                code.append(STOREI(self.memory_map.get_address(target.name)))
+                code.append(STOREI(self.memory_map.get_address(target)))
                 
             else:
-                code.append(STORE(self.memory_map.get_address(target.name)))
+                code.append(STORE(self.memory_map.get_address(target)))
                 
             self.instruction_counter += 2
     
         else:
-            code.append(LOAD(self.memory_map.get_address(value.name)))
+            code.append(LOAD(self.memory_map.get_address(value)))
             
             if isinstance(target, BY_REFERENCE):
-                code.append(STOREI(self.memory_map.get_address(target.name)))
+                code.append(STOREI(self.memory_map.get_address(target)))
                 
             else:
-                code.append(STORE(self.memory_map.get_address(target.name)))
+                code.append(STORE(self.memory_map.get_address(target)))
                 
             self.instruction_counter += 2
             
@@ -203,6 +239,7 @@ class VMCodeGenerator:
         return code
             
         
+    @instructions.register(IRProcCall)
     def compile_proc_call_op(self, op: IRProcCall) -> List[str]:
         # print(f"CALL {op}")
         # print(f"ARGS {op.args}")
@@ -216,18 +253,18 @@ class VMCodeGenerator:
                     
             if passed_argument.is_array or passed_argument.is_pointer:
                 
-                code.append(LOAD(self.memory_map.get_address(passed_argument.name)))
-                code.append(STORE(self.memory_map.get_address(param_signature.name)))
+                code.append(LOAD(self.memory_map.get_address(passed_argument)))
+                code.append(STORE(self.memory_map.get_address(param_signature)))
             else:
-                code.append(SET(self.memory_map.get_address(passed_argument.name)))
-                code.append(STORE(self.memory_map.get_address(param_signature.name)))
+                code.append(SET(self.memory_map.get_address(passed_argument)))
+                code.append(STORE(self.memory_map.get_address(param_signature)))
             self.instruction_counter +=2
         proc_label = self.proc_info[op.name].begin_id
         
 
         # print(f"RETURN ADDRESS {return_address} from line {self.instruction_counter}")
         code.append(SET_HERE(3))
-        code.append(STORE(self.memory_map.get_address(self.proc_info[op.name].return_var.name)))
+        code.append(STORE(self.memory_map.get_address(self.proc_info[op.name].return_var)))
         code.append(JUMPLABEL(proc_label))
         self.instruction_counter += 3  # Coun
             
@@ -239,13 +276,14 @@ class VMCodeGenerator:
             print("----"*8)
         return code
          
+    @instructions.register(IRReturn)
     def compile_return_op(self, op: IRReturn) -> List[str]:
         
         code = []
         
         return_value = op.return_variable
         self.instruction_counter += 1
-        code.append(RETURN(self.memory_map.get_address(return_value.name)))
+        code.append(RETURN(self.memory_map.get_address(return_value)))
         
         if self.debug:
             print(f"IRReturn {op}")
@@ -255,6 +293,7 @@ class VMCodeGenerator:
         
         return code
         
+    @instructions.register(IRBinaryOp)
     def compile_binary_op(self, op: IRBinaryOp) -> List[str]:
         
         target = op.target
@@ -267,140 +306,140 @@ class VMCodeGenerator:
         if operator == '+':
             
             if isinstance(left, BY_REFERENCE):
-                code.append(LOADI(self.memory_map.get_address(left.name)))
+                code.append(LOADI(self.memory_map.get_address(left)))
             else:
-                code.append(LOAD(self.memory_map.get_address(left.name)))
+                code.append(LOAD(self.memory_map.get_address(left)))
             self.instruction_counter += 1
             
             if isinstance(right, BY_REFERENCE):
-                code.append(ADDI(self.memory_map.get_address(right.name)))
+                code.append(ADDI(self.memory_map.get_address(right)))
             else:
-                code.append(ADD(self.memory_map.get_address(right.name)))
+                code.append(ADD(self.memory_map.get_address(right)))
             self.instruction_counter += 1
             
             if isinstance(target, BY_REFERENCE):
-                code.append(STOREI(self.memory_map.get_address(target.name)))
+                code.append(STOREI(self.memory_map.get_address(target)))
             else:
-                code.append(STORE(self.memory_map.get_address(target.name)))
+                code.append(STORE(self.memory_map.get_address(target)))
             self.instruction_counter += 1
             
         elif operator == '-':
             
             if isinstance(left, BY_REFERENCE):
-                code.append(LOADI(self.memory_map.get_address(left.name)))
+                code.append(LOADI(self.memory_map.get_address(left)))
             else:
-                code.append(LOAD(self.memory_map.get_address(left.name)))
+                code.append(LOAD(self.memory_map.get_address(left)))
             self.instruction_counter += 1
             
             if isinstance(right, BY_REFERENCE):
-                code.append(SUBI(self.memory_map.get_address(right.name)))
+                code.append(SUBI(self.memory_map.get_address(right)))
             else:
-                code.append(SUB(self.memory_map.get_address(right.name)))
+                code.append(SUB(self.memory_map.get_address(right)))
             self.instruction_counter += 1
             
             if isinstance(target, BY_REFERENCE):
-                code.append(STOREI(self.memory_map.get_address(target.name)))
+                code.append(STOREI(self.memory_map.get_address(target)))
             else:
-                code.append(STORE(self.memory_map.get_address(target.name)))
+                code.append(STORE(self.memory_map.get_address(target)))
             self.instruction_counter += 1
             
             
         elif operator == '*':
             
             if isinstance(left, BY_REFERENCE):
-                code.append(LOADI(self.memory_map.get_address(left.name)))
+                code.append(LOADI(self.memory_map.get_address(left)))
             else:
-                code.append(LOAD(self.memory_map.get_address(left.name)))
+                code.append(LOAD(self.memory_map.get_address(left)))
             self.instruction_counter += 1
             
-            code.append(STORE(self.memory_map.get_address("arg1")))
+            code.append(STORE(self.memory_map.get_address(self.arg1)))
             
             if isinstance(right, BY_REFERENCE):
-                code.append(LOADI(self.memory_map.get_address(right.name)))
+                code.append(LOADI(self.memory_map.get_address(right)))
             else:
-                code.append(LOAD(self.memory_map.get_address(right.name)))
+                code.append(LOAD(self.memory_map.get_address(right)))
             self.instruction_counter += 1
             
-            code.append(STORE(self.memory_map.get_address("arg2")))
+            code.append(STORE(self.memory_map.get_address(self.arg2)))
     
             
             return_address = self.instruction_counter + 3
             # print(f"RETURN ADDRESS {return_address} from line {self.instruction_counter}")
             code.append(SET_HERE(3))
-            code.append(STORE(self.memory_map.get_address(self.proc_info["mul"].return_var.name)))
+            code.append(STORE(self.memory_map.get_address(self.proc_info["mul"].return_var)))
             code.append(JUMPLABEL(self.proc_info["mul"].begin_id))
             self.instruction_counter += 3
             
-            code.append(LOAD(self.memory_map.get_address("result")))
+            code.append(LOAD(self.memory_map.get_address(self.result)))
             
             if isinstance(target, BY_REFERENCE):
-                code.append(STOREI(self.memory_map.get_address(target.name)))
+                code.append(STOREI(self.memory_map.get_address(target)))
             else:
-                code.append(STORE(self.memory_map.get_address(target.name)))
+                code.append(STORE(self.memory_map.get_address(target)))
         
         elif operator == '/':
             
             if isinstance(left, BY_REFERENCE):
-                code.append(LOADI(self.memory_map.get_address(left.name)))
+                code.append(LOADI(self.memory_map.get_address(left)))
             else:
-                code.append(LOAD(self.memory_map.get_address(left.name)))
+                code.append(LOAD(self.memory_map.get_address(left)))
             self.instruction_counter += 1
             
-            code.append(STORE(self.memory_map.get_address("arg1")))
+            code.append(STORE(self.memory_map.get_address(self.arg1)))
             
             if isinstance(right, BY_REFERENCE):
-                code.append(LOADI(self.memory_map.get_address(right.name)))
+                code.append(LOADI(self.memory_map.get_address(right)))
             else:
-                code.append(LOAD(self.memory_map.get_address(right.name)))
+                code.append(LOAD(self.memory_map.get_address(right)))
             self.instruction_counter += 1
             
-            code.append(STORE(self.memory_map.get_address("arg2")))
+            code.append(STORE(self.memory_map.get_address(self.arg2)))
             
             return_address = self.instruction_counter + 3
             # print(f"RETURN ADDRESS {return_address} from line {self.instruction_counter}")
             code.append(SET_HERE(3))
-            code.append(STORE(self.memory_map.get_address(self.proc_info["div"].return_var.name)))
+            code.append(STORE(self.memory_map.get_address(self.proc_info["div"].return_var)))
             code.append(JUMPLABEL(self.proc_info["div"].begin_id))
             self.instruction_counter += 3
             
-            code.append(LOAD(self.memory_map.get_address("result")))
+            code.append(LOAD(self.memory_map.get_address(self.result)))
             
             if isinstance(target, BY_REFERENCE):
-                code.append(STOREI(self.memory_map.get_address(target.name)))
+                code.append(STOREI(self.memory_map.get_address(target)))
             else:
-                code.append(STORE(self.memory_map.get_address(target.name)))
+                code.append(STORE(self.memory_map.get_address(target)))
         
         elif operator == '%':
             
             if isinstance(left, BY_REFERENCE):
-                code.append(LOADI(self.memory_map.get_address(left.name)))
+                code.append(LOADI(self.memory_map.get_address(left)))
             else:
-                code.append(LOAD(self.memory_map.get_address(left.name)))
+                code.append(LOAD(self.memory_map.get_address(left)))
             self.instruction_counter += 1
             
-            code.append(STORE(self.memory_map.get_address("arg1")))
+            code.append(STORE(self.memory_map.get_address(self.arg1)))
             
             if isinstance(right, BY_REFERENCE):
-                code.append(LOADI(self.memory_map.get_address(right.name)))
+                code.append(LOADI(self.memory_map.get_address(right)))
             else:
-                code.append(LOAD(self.memory_map.get_address(right.name)))
+                code.append(LOAD(self.memory_map.get_address(right)))
             self.instruction_counter += 1
             
-            code.append(STORE(self.memory_map.get_address("arg2")))
+            code.append(STORE(self.memory_map.get_address(self.arg2)))
             
             return_address = self.instruction_counter + 3
             # print(f"RETURN ADDRESS {return_address} from line {self.instruction_counter}")
             code.append(SET_HERE(3))
-            code.append(STORE(self.memory_map.get_address(self.proc_info["div"].return_var.name)))
+            code.append(STORE(self.memory_map.get_address(self.proc_info["div"].return_var)))
             code.append(JUMPLABEL(self.proc_info["div"].begin_id))
             self.instruction_counter += 3
             
-            code.append(LOAD(self.memory_map.get_address("result2")))
+            code.append(LOAD(self.memory_map.get_address(self.result2)))
             
             if isinstance(target, BY_REFERENCE):
-                code.append(STOREI(self.memory_map.get_address(target.name)))
+                code.append(STOREI(self.memory_map.get_address(target)))
             else:
-                code.append(STORE(self.memory_map.get_address(target.name)))
+                code.append(STORE(self.memory_map.get_address(target)))
             
             
                      
@@ -418,6 +457,7 @@ class VMCodeGenerator:
             
         
     
+    @instructions.register(IRJump)
     def compile_jump_op(self, op: IRJump) -> List[str]:
         code = []
         self.instruction_counter += 1
@@ -431,19 +471,20 @@ class VMCodeGenerator:
         
         return code
     
+    @instructions.register(IRHalf)
     def compile_half_op(self, op: IRHalf) -> List[str]:
         code = []
         target = op.target
         
         if isinstance(target, BY_REFERENCE):
-            code.append(LOADI(self.memory_map.get_address(target.name)))
+            code.append(LOADI(self.memory_map.get_address(target)))
             code.append(HALF())
-            code.append(STOREI(self.memory_map.get_address(target.name)))
+            code.append(STOREI(self.memory_map.get_address(target)))
             self.instruction_counter += 3   
         else:
-            code.append(LOAD(self.memory_map.get_address(target.name)))
+            code.append(LOAD(self.memory_map.get_address(target)))
             code.append(HALF())
-            code.append(STORE(self.memory_map.get_address(target.name)))
+            code.append(STORE(self.memory_map.get_address(target)))
             self.instruction_counter += 3
         
         if self.debug:
@@ -454,38 +495,40 @@ class VMCodeGenerator:
             
         return code
     
+    @instructions.register(IRArrayRead)
     def compile_array_read_op(self, op: IRArrayRead) -> List[str]:
         
         start = op.array
         index = op.index #always temp
-        index_adress = self.memory_map.get_address(index.name)
+        index_adress = self.memory_map.get_address(index)
         target = op.target
         
         code = []
         
-        code.append(LOAD(self.memory_map.get_address(start.name)))
-        code.append(ADD(self.memory_map.get_address(index.name)))
+        code.append(LOAD(self.memory_map.get_address(start)))
+        code.append(ADD(self.memory_map.get_address(index)))
         code.append(LOADI(0))
         self.instruction_counter += 3
         
         if target.is_param:
-            code.append(STOREI(self.memory_map.get_address(target.name)))
+            code.append(STOREI(self.memory_map.get_address(target)))
             
         else:
-            code.append(STORE(self.memory_map.get_address(target.name)))
+            code.append(STORE(self.memory_map.get_address(target)))
         self.instruction_counter += 1
         return code
     
+    @instructions.register(IRArrayWrite)
     def compile_array_write_op(self, op: IRArrayWrite) -> List[str]:
         
         start = op.array
         index = op.index
         value = op.value
         
-        start_adress = self.memory_map.get_address(start.name)
-        index_adress = self.memory_map.get_address(index.name)
-        value_adress = self.memory_map.get_address(value.name)
-        temp_adress = self.memory_map.get_address("temp")
+        start_adress = self.memory_map.get_address(start)
+        index_adress = self.memory_map.get_address(index)
+        value_adress = self.memory_map.get_address(value)
+        temp_adress = self.memory_map.get_address(self.temp)
         code = []
         
         code.append(LOAD(start_adress))
@@ -506,6 +549,7 @@ class VMCodeGenerator:
         
         
         
+    @instructions.register(IRCondJump)
     def compile_cond_jump_op(self, op: IRCondJump) -> List[str]:
         
  
@@ -517,14 +561,14 @@ class VMCodeGenerator:
         right = op.right
         
         if isinstance(left, BY_REFERENCE):
-            code.append(LOADI(self.memory_map.get_address(left.name)))
+            code.append(LOADI(self.memory_map.get_address(left)))
         else:
-            code.append(LOAD(self.memory_map.get_address(left.name)))
+            code.append(LOAD(self.memory_map.get_address(left)))
             
         if isinstance(right, BY_REFERENCE):
-            code.append(SUBI(self.memory_map.get_address(right.name)))
+            code.append(SUBI(self.memory_map.get_address(right)))
         else:
-            code.append(SUB(self.memory_map.get_address(right.name)))
+            code.append(SUB(self.memory_map.get_address(right)))
             
         self.instruction_counter += 3
 
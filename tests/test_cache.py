@@ -0,0 +1,40 @@
+"""
+Size accounting and eviction of the compile cache. Run from the repository
+root with:
+PYTHONPATH=src python -m pytest tests
+"""
+import tempfile
+from unittest import TestCase
+
+from compiler.cache import EVICT_TARGET, CompileCache
+
+
+class TestCompileCache(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_running_total_matches_directory(self):
+        cache = CompileCache(self.directory, max_bytes=10_000)
+        code = ["LOAD 1"] * 20  # 140 bytes
+        for i in range(200):
+            cache.put(f"{i:064x}", code)
+            self.assertEqual(cache.size(), cache._total)
+            self.assertLessEqual(cache._total, cache.max_bytes)
+        # Overwriting an entry replaces its size rather than adding to it
+        cache.put(f"{199:064x}", code[:10])
+        self.assertEqual(cache.size(), cache._total)
+        self.assertGreater(cache.stats.evictions, 0)
+
+    def test_evicts_least_recently_used_below_budget(self):
+        cache = CompileCache(self.directory, max_bytes=1_000)
+        code = ["LOAD 1"] * 10  # 70 bytes
+        keys = [f"{i:064x}" for i in range(14)]
+        for key in keys:
+            cache.put(key, code)
+        self.assertIsNotNone(cache.get(keys[0]))
+        cache.put(f"{99:064x}", code)
+        self.assertLessEqual(cache.size(), cache.max_bytes * EVICT_TARGET)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
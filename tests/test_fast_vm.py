@@ -0,0 +1,71 @@
+"""
+FastMachine against the reference Machine on random VM code.
+Run from the repository root with: PYTHONPATH=src python -m pytest tests
+"""
+import random
+from unittest import TestCase
+
+from compiler.simulator.fast import run_fast
+from compiler.simulator.machine import COSTS, NO_OPERAND, VMError, run
+
+MNEMONICS = sorted(COSTS)
+JUMPS = {"JUMP", "JPOS", "JZERO", "JNEG"}
+
+
+def random_program(rng: random.Random, length: int):
+    program = []
+    for line in range(length):
+        mnemonic = rng.choice(MNEMONICS)
+        if mnemonic in NO_OPERAND:
+            operand = 0
+        elif mnemonic in JUMPS:
+            operand = rng.randint(-line, length - line)
+        elif mnemonic == "SET":
+            operand = rng.randint(-3, 8)
+        else:
+            operand = rng.randint(0, 4)  # addresses, often 0 (p0 itself)
+        program.append((mnemonic, operand))
+    if rng.random() < 0.9:
+        program.append(("HALT", 0))
+    return program
+
+
+def outcome(engine, program, inputs, step_limit):
+    try:
+        result = engine(program, inputs, step_limit)
+    except VMError as e:
+        return type(e), str(e)
+    return result.output, result.cost, result.steps, dict(result.memory)
+
+
+def same_memory(outcome):
+    """Memory with the cells read but never written (0 in the fast engine) left out."""
+    if len(outcome) != 4:
+        return outcome
+    output, cost, steps, memory = outcome
+    return output, cost, steps, {k: v for k, v in memory.items() if v}
+
+
+class TestFastMachine(TestCase):
+    def check(self, program, inputs=(), step_limit=1000):
+        reference = same_memory(outcome(run, program, list(inputs), step_limit))
+        fast = same_memory(outcome(run_fast, program, list(inputs), step_limit))
+        self.assertEqual(reference, fast, program)
+
+    def test_get_into_accumulator_reads_once(self):
+        self.check([("GET", 0), ("PUT", 0), ("HALT", 0)], [7, 9])
+        self.check([("GET", 0), ("ADD", 0), ("PUT", 0), ("HALT", 0)], [7, 9, 11])
+
+    def test_put_of_pending_expression(self):
+        self.check([("SET", 4), ("ADDI", 2), ("PUT", 0), ("HALT", 0)])
+
+    def test_running_off_the_end(self):
+        self.check([("LOAD", 0), ("HALF", 0)])
+        self.check([("SET", 1), ("JPOS", 2), ("HALT", 0)])
+
+    def test_random_programs(self):
+        rng = random.Random(2024)
+        for _ in range(3000):
+            program = random_program(rng, rng.randint(1, 12))
+            inputs = [rng.randint(-5, 5) for _ in range(4)]
+            self.check(program, inputs, step_limit=rng.choice([50, 500, 5000]))
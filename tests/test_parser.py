@@ -0,0 +1,54 @@
+"""
+Incremental reparsing against parsing from scratch. Run from the repository
+root with:
+PYTHONPATH=src python -m pytest tests
+"""
+import time
+from unittest import TestCase
+
+from compiler.parser import CompilerParser, SourceEdit
+
+STATEMENTS = 20000
+RUNS = 5
+NEAR_START = 100
+
+
+def best_of(runs, function):
+    """Shortest of several timed calls, with the last call's result."""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+class TestIncrementalParse(TestCase):
+    def setUp(self):
+        self.parser = CompilerParser()
+        self.source = (
+            "PROGRAM IS\n  x\nBEGIN\n" + "  x := x + 1;\n" * STATEMENTS + "END\n"
+        ).encode()
+        self.tree, self.errors = self.parser.parse(self.source)
+
+    def check_edit_near_start(self, text: bytes):
+        # Early commands sit deep in the left-recursive command list
+        line = len("  x := x + 1;\n")
+        offset = self.source.index(b"+ 1", NEAR_START * line) + 2
+        edit = SourceEdit.from_replacement(self.source, offset, offset + 1, text)
+        edited = edit.apply(self.source, text)
+
+        full_time, (_, expected) = best_of(RUNS, lambda: self.parser.parse(edited))
+        trees = [self.tree.copy() for _ in range(RUNS)]
+        incremental_time, (_, errors) = best_of(
+            RUNS, lambda: self.parser.parse_incremental(trees.pop(), self.errors, edited, edit)
+        )
+        self.assertEqual(expected, errors)
+        self.assertLess(incremental_time, full_time)
+        return errors
+
+    def test_valid_edit_near_start(self):
+        self.assertEqual([], self.check_edit_near_start(b"2"))
+
+    def test_breaking_edit_near_start(self):
+        self.assertEqual(1, len(self.check_edit_near_start(b"+")))
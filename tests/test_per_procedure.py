@@ -0,0 +1,51 @@
+"""
+Per-procedure compilation, serial and in worker processes, against the
+whole-program path. Run from the repository root with:
+PYTHONPATH=src python -m pytest tests
+"""
+import os
+import tempfile
+from unittest import TestCase
+
+from compiler.pipeline import CompilerPipeline
+from compiler.profiling import CompileProfile
+
+
+def generate_program(procedures: int) -> str:
+    """Procedures calling their predecessors, with loops, arrays, temps and runtime arithmetic."""
+    parts = []
+    for i in range(procedures):
+        calls = f"    p{i - 1}(t, n);\n" if i else ""
+        parts.append(
+            f"PROCEDURE p{i}(T t, n) IS\n  x, y[0:3]\nBEGIN\n"
+            f"  x := n * {i + 2};\n"
+            f"  FOR k FROM 0 TO 3 DO y[k] := x / {i + 1}; ENDFOR\n"
+            f"  WHILE x > 0 DO\n{calls}    x := x - y[1];\n  ENDWHILE\n"
+            f"  x := n % 2;\n  IF x = 1 THEN t[0] := y[2] + x; ELSE t[1] := n; ENDIF\n"
+            f"  REPEAT n := n - 1; UNTIL n <= 0;\n"
+            "END\n"
+        )
+    parts.append(
+        f"PROGRAM IS\n  a[0:1], b\nBEGIN\n  READ b;\n  p{procedures - 1}(a, b);\n"
+        "  WRITE a[0];\n  WRITE a[1];\nEND\n"
+    )
+    return "".join(parts)
+
+
+class TestPerProcedure(TestCase):
+    def compile(self, source, **options):
+        profile = CompileProfile(trace_memory=False)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "out.mr")
+            CompilerPipeline().compile_to(source, path, profile=profile, **options)
+            with open(path) as f:
+                return f.read(), profile.counts["ir_instructions"]
+
+    def test_same_output_and_counts(self):
+        source = generate_program(40)
+        expected, ir_instructions = self.compile(source)
+        for options in ({}, {"jobs": 2}, {"jobs": 3}):
+            with self.subTest(**options):
+                code, count = self.compile(source, per_procedure=True, **options)
+                self.assertEqual(expected, code)
+                self.assertEqual(ir_instructions, count)